@@ -0,0 +1,176 @@
+"""Generates synthetic org-mode documents, and edited copies of them, for
+benchmarking.
+
+Everything is driven by a seed, so the same arguments always give the same
+document.
+"""
+import argparse
+import random
+
+
+TODO_KEYWORDS = [None, None, "TODO", "NEXT", "DONE"]
+TAGS = ["work", "home", "project", "urgent", "waiting", "someday", "errand", "call"]
+WORDS = [
+    "meeting", "notes", "review", "plan", "draft", "email", "report", "budget",
+    "design", "release", "fix", "call", "lunch", "read", "write", "ship",
+]
+
+EDIT_OPERATIONS = ['insert', 'delete', 'move', 'rename', 'reorder']
+
+
+class Heading(object):
+
+    def __init__(self, title, todo, tags, properties, body):
+        self.title = title
+        self.todo = todo
+        self.tags = tags
+        self.properties = properties
+        self.body = body
+        self.children = []
+
+
+def _words(rand, count):
+    return " ".join(rand.choice(WORDS) for _ in range(count))
+
+
+def _make_heading(rand, number, body_lines, property_density, tag_density):
+    tags = [tag for tag in TAGS if rand.random() < tag_density]
+    properties = []
+    if rand.random() < property_density:
+        properties = [
+            ("PROPERTY%d" % index, _words(rand, 2))
+            for index in range(rand.randint(1, 20))
+        ]
+    body = [_words(rand, 8) for _ in range(rand.randint(0, body_lines))]
+
+    return Heading(
+        "%s %d" % (_words(rand, 3), number),
+        rand.choice(TODO_KEYWORDS),
+        tags,
+        properties,
+        body)
+
+
+def generate_document(seed=0, heading_count=1000, max_depth=4, body_lines=5,
+                      property_density=0.3, tag_density=0.2):
+    """Returns the top-level headings of a random document.
+
+    heading_count -- how many headings, at all levels
+    max_depth -- how deeply headings can be nested
+    body_lines -- the most lines of text under a heading
+    property_density -- the chance that a heading has a property drawer
+    tag_density -- the chance that a heading has each tag
+    """
+    rand = random.Random(seed)
+    top_level = []
+    # the last heading at each depth, to add children to
+    open_headings = []
+
+    for number in range(heading_count):
+        depth = rand.randint(0, min(len(open_headings), max_depth - 1))
+        heading = _make_heading(rand, number, body_lines, property_density, tag_density)
+
+        del open_headings[depth:]
+        if depth == 0:
+            top_level.append(heading)
+        else:
+            open_headings[-1].children.append(heading)
+        open_headings.append(heading)
+
+    return top_level
+
+
+def _all_sibling_lists(headings):
+    sibling_lists = [headings]
+    for heading in headings:
+        sibling_lists.extend(_all_sibling_lists(heading.children))
+    return sibling_lists
+
+
+def _copy(heading):
+    copied = Heading(
+        heading.title, heading.todo, list(heading.tags), list(heading.properties), list(heading.body))
+    copied.children = [_copy(child) for child in heading.children]
+    return copied
+
+
+def edit_document(headings, seed=0, edit_count=10, operations=EDIT_OPERATIONS):
+    """Returns an edited copy of a document from generate_document.
+
+    Each edit is one of the operations, picked at random:
+        insert -- add a new heading
+        delete -- remove a heading and its subtrees
+        move -- move a heading to another parent
+        rename -- change a heading's title
+        reorder -- shuffle a list of siblings
+    """
+    rand = random.Random(seed)
+    headings = [_copy(heading) for heading in headings]
+
+    for number in range(edit_count):
+        sibling_lists = [siblings for siblings in _all_sibling_lists(headings) if siblings]
+        if not sibling_lists:
+            break
+        siblings = rand.choice(sibling_lists)
+        index = rand.randrange(len(siblings))
+        operation = rand.choice(operations)
+
+        if operation == 'insert':
+            siblings.insert(index, _make_heading(rand, -number - 1, 5, 0.3, 0.2))
+        elif operation == 'delete':
+            del siblings[index]
+        elif operation == 'move':
+            heading = siblings.pop(index)
+            destination = rand.choice(_all_sibling_lists(headings))
+            destination.insert(rand.randint(0, len(destination)), heading)
+        elif operation == 'rename':
+            siblings[index].title += " " + _words(rand, 1)
+        elif operation == 'reorder':
+            rand.shuffle(siblings)
+
+    return headings
+
+
+def render_document(headings, depth=1):
+    """Returns the lines of org-mode for a document."""
+    lines = []
+    for heading in headings:
+        line = "*" * depth
+        if heading.todo:
+            line += " " + heading.todo
+        line += " " + heading.title
+        if heading.tags:
+            line += "   :" + ":".join(heading.tags) + ":"
+        lines.append(line + "\n")
+
+        if heading.properties:
+            lines.append(":PROPERTIES:\n")
+            lines.extend(":%s: %s \n" % (key, value) for key, value in heading.properties)
+            lines.append(":END:\n")
+        lines.extend(body_line + "\n" for body_line in heading.body)
+        lines.extend(render_document(heading.children, depth + 1))
+
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Writes a synthetic org-mode document.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--headings', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--body-lines', type=int, default=5)
+    parser.add_argument('--property-density', type=float, default=0.3)
+    parser.add_argument('--tag-density', type=float, default=0.2)
+    parser.add_argument(
+        '--edits', type=int, default=0,
+        help='Write an edited copy of the document, with this many edits.')
+    args = parser.parse_args()
+
+    document = generate_document(
+        args.seed, args.headings, args.depth, args.body_lines,
+        args.property_density, args.tag_density)
+    if args.edits:
+        document = edit_document(document, args.seed, args.edits)
+
+    for line in render_document(document):
+        print line,
@@ -0,0 +1,126 @@
+"""Times each stage of diffing on synthetic documents, and writes the results
+as JSON.
+
+    python benchmarks/run.py --headings 1000 10000 --output results.json
+
+Each stage is timed on its own, so a change to one of them shows up in its
+own number:
+    parse_lines -- parsing the old and new documents
+    pair_up_subtrees -- pairing up the top-level headings
+    smart_zip -- aligning the top-level headings without anchoring
+    struct_diff -- the whole diff of the parsed documents
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate import EDIT_OPERATIONS
+from generate import edit_document
+from generate import generate_document
+from generate import render_document
+
+from org_mode_diff.diff import org_items_are_similar
+from org_mode_diff.diff import pair_up_subtrees
+from org_mode_diff.diff import struct_diff
+from org_mode_diff.helpers import clear_caches
+from org_mode_diff.helpers import smart_zip
+from org_mode_diff.models import DiffTuple
+from org_mode_diff.parser import parse_lines
+
+
+def best_time(function, repeat):
+    """Returns the fastest of repeat runs of function, in seconds, with the
+    caches emptied before each run."""
+    times = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def run_scenario(args, heading_count):
+    old_document = generate_document(
+        args.seed, heading_count, args.depth, args.body_lines,
+        args.property_density, args.tag_density)
+    new_document = edit_document(
+        old_document, args.seed, args.edits, args.operations)
+    old_lines = render_document(old_document)
+    new_lines = render_document(new_document)
+
+    old_org = parse_lines(old_lines)
+    new_org = parse_lines(new_lines)
+    subtrees = DiffTuple(old_org.subtrees, new_org.subtrees)
+
+    timings = {
+        'parse_lines': best_time(
+            lambda: (parse_lines(old_lines), parse_lines(new_lines)), args.repeat),
+        'pair_up_subtrees': best_time(
+            lambda: pair_up_subtrees(subtrees), args.repeat),
+        'smart_zip': best_time(
+            lambda: smart_zip(subtrees, similarity_function=org_items_are_similar), args.repeat),
+        'struct_diff': best_time(
+            lambda: struct_diff(DiffTuple(old_org, new_org), args.headers_only, supress_output=True),
+            args.repeat),
+    }
+
+    return {
+        'headings': heading_count,
+        'old_lines': len(old_lines),
+        'new_lines': len(new_lines),
+        'top_level_headings': [len(subtrees.old), len(subtrees.new)],
+        'seconds': timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times diffing synthetic org-mode documents.')
+    parser.add_argument(
+        '--headings', type=int, nargs='+', default=[100, 1000, 2000],
+        help='Number of headings in each document to time.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--body-lines', type=int, default=5)
+    parser.add_argument('--property-density', type=float, default=0.3)
+    parser.add_argument('--tag-density', type=float, default=0.2)
+    parser.add_argument('--edits', type=int, default=20)
+    parser.add_argument(
+        '--operations', nargs='+', choices=EDIT_OPERATIONS, default=EDIT_OPERATIONS,
+        help='Kinds of edits to make to the new document.')
+    parser.add_argument('--headers-only', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='File to write the results to, instead of stdout.')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'settings': {
+            'seed': args.seed,
+            'depth': args.depth,
+            'body_lines': args.body_lines,
+            'property_density': args.property_density,
+            'tag_density': args.tag_density,
+            'edits': args.edits,
+            'operations': args.operations,
+            'headers_only': args.headers_only,
+            'repeat': args.repeat,
+        },
+        'scenarios': [run_scenario(args, heading_count) for heading_count in args.headings],
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import collections
+import itertools
+import multiprocessing
+import os
+
+from diff import struct_diff
+from models import DiffTuple
+from parser import OrgParserException
+from parser import parse_path
+
+
+FilePair = collections.namedtuple('FilePair', [
+    'old',  # path of the original file
+    'new',  # path of the updated file
+    'output',  # path to write the diff to, or None
+])
+
+
+def parse_file_pair(spec):
+    """Parses a pair given as old:new"""
+    old, separator, new = spec.partition(':')
+    if not separator or not old or not new:
+        raise ValueError("Expected a pair of files as old:new, got %r" % (spec,))
+    return FilePair(old, new, None)
+
+
+def read_manifest(manifest_file):
+    """Reads the pairs of files to diff from a manifest.
+
+    Each line has the old file, the new file and, optionally, the file to
+    write their diff to, separated by tabs. Blank lines and lines starting
+    with # are skipped.
+
+    returns a list of FilePairs
+    """
+    file_pairs = []
+    for line in manifest_file:
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.startswith('#'):
+            continue
+
+        fields = line.split('\t')
+        if len(fields) == 2:
+            fields.append(None)
+        elif len(fields) != 3:
+            raise ValueError("Expected old, new and optional output separated by tabs, got %r" % (line,))
+        file_pairs.append(FilePair(*fields))
+
+    return file_pairs
+
+
+def output_path(file_pair, output_dir):
+    """Where to write a pair's diff: its own output if it has one, otherwise
+    the new file's path with .diff added, under output_dir.
+
+    The new file's path is made relative, dropping any .. in it, so the diff
+    is always written somewhere under output_dir.
+    """
+    if file_pair.output is not None:
+        return file_pair.output
+    if output_dir is None:
+        return None
+
+    _, path = os.path.splitdrive(os.path.normpath(file_pair.new))
+    parts = [part for part in path.split(os.sep) if part not in ('', os.curdir, os.pardir)]
+    return os.path.join(output_dir, *parts) + '.diff'
+
+
+def diff_file_pair(file_pair, headers_only, parse_cache=None, detect_moves=False, summary=False):
+    """Parses and diffs a pair of files.
+
+    parse_cache -- a ParseCache to parse the files through, or None
+    detect_moves, summary -- as in struct_diff
+
+    returns the list of DiffResults
+    """
+    parse = parse_path if parse_cache is None else parse_cache.parse_path
+    old_org = parse(file_pair.old)
+    new_org = parse(file_pair.new)
+    return struct_diff(
+        DiffTuple(old_org, new_org), headers_only, supress_output=True, detect_moves=detect_moves,
+        summary=summary)
+
+
+def _diff_file_pair_or_error(file_pair, headers_only, parse_cache, detect_moves, summary):
+    try:
+        return diff_file_pair(file_pair, headers_only, parse_cache, detect_moves, summary)
+    except (EnvironmentError, OrgParserException) as error:
+        return error
+
+
+def _diff_file_pair_job(job):
+    return _diff_file_pair_or_error(*job)
+
+
+def iter_batch_diff(file_pairs, headers_only, jobs=1, parse_cache=None, detect_moves=False,
+                    summary=False):
+    """Diffs each pair of files in this process, or spread over jobs
+    processes.
+
+    parse_cache, detect_moves, summary -- as in diff_file_pair
+
+    yields (FilePair, list of DiffResults), in the same order as file_pairs.
+    If one of a pair's files can't be read or parsed, the EnvironmentError
+    or OrgParserException is yielded in place of its DiffResults, and the
+    other pairs are still diffed.
+    """
+    if jobs <= 1:
+        for file_pair in file_pairs:
+            yield file_pair, _diff_file_pair_or_error(
+                file_pair, headers_only, parse_cache, detect_moves, summary)
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        all_diff_results = pool.imap(
+            _diff_file_pair_job,
+            [(file_pair, headers_only, parse_cache, detect_moves, summary)
+             for file_pair in file_pairs])
+        for file_pair, diff_results in itertools.izip(file_pairs, all_diff_results):
+            yield file_pair, diff_results
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
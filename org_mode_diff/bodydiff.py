@@ -0,0 +1,319 @@
+import difflib
+
+import config
+from helpers import find_anchors
+
+
+DIFFLIB = 'difflib'
+MYERS = 'myers'
+ENGINES = (DIFFLIB, MYERS)
+
+# How far (in changes from each end) to search a gap before giving up on it
+# and replacing it as a whole. The search takes O(cost ** 2) time.
+_MAX_COST = 256
+
+
+def unified_diff(old_lines, new_lines, engine=None):
+    """Yields the lines of a unified diff of two lists of lines, the same as
+    difflib.unified_diff(old_lines, new_lines, "old", "new", lineterm="").
+
+    engine -- DIFFLIB or MYERS. Defaults to config.body_diff_engine.
+        difflib's SequenceMatcher can be very slow on long texts with many
+        repeated lines. MYERS looks for the smallest diff instead (see
+        myers_opcodes), which is fast however long the text is. They can
+        line up the changes differently, but the format's the same.
+    """
+    if engine is None:
+        engine = config.body_diff_engine
+
+    if engine == DIFFLIB:
+        return difflib.unified_diff(old_lines, new_lines, "old", "new", lineterm="")
+    if engine == MYERS:
+        return _format_unified_diff(
+            old_lines, new_lines, myers_opcodes(old_lines, new_lines))
+    raise ValueError("Unknown body diff engine %r, expected one of %s" % (engine, ", ".join(ENGINES)))
+
+
+def myers_opcodes(old, new):
+    """Returns the opcodes of an edit turning old into new, in the same
+    format as difflib.SequenceMatcher.get_opcodes.
+
+    Lines that are the same at the start or end, and then lines that appear
+    exactly once in both (like in patience diff), are matched up first, so
+    the edit isn't always the shortest one. In each gap between them, lines
+    that aren't in the other side's gap are left out (like xdiff does), and
+    the rest are diffed with Myers' algorithm, which takes O((N + M) * D)
+    time and O(N + M) space for D changes. A gap that needs more than about
+    _MAX_COST changes is replaced as a whole.
+    """
+    # Compare small ints rather than strings.
+    ids = {}
+    old_ids = [ids.setdefault(line, len(ids)) for line in old]
+    new_ids = [ids.setdefault(line, len(ids)) for line in new]
+
+    old_count = len(old_ids)
+    new_count = len(new_ids)
+
+    prefix = 0
+    while prefix < old_count and prefix < new_count and old_ids[prefix] == new_ids[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < old_count - prefix and suffix < new_count - prefix
+           and old_ids[old_count - 1 - suffix] == new_ids[new_count - 1 - suffix]):
+        suffix += 1
+
+    # (old index, new index, length) of each run of matching lines
+    blocks = [(0, 0, prefix)]
+
+    old_start = new_start = prefix
+    anchors = find_anchors(
+        old_ids[prefix:old_count - suffix], new_ids[prefix:new_count - suffix], _identity)
+    for old_index, new_index in anchors:
+        old_index += prefix
+        new_index += prefix
+        _diff_gap(old_ids, old_start, old_index, new_ids, new_start, new_index, blocks)
+        blocks.append((old_index, new_index, 1))
+        old_start = old_index + 1
+        new_start = new_index + 1
+    _diff_gap(
+        old_ids, old_start, old_count - suffix, new_ids, new_start, new_count - suffix, blocks)
+
+    blocks.append((old_count - suffix, new_count - suffix, suffix))
+    return _opcodes_from_blocks(blocks, old_count, new_count)
+
+
+def _identity(item):
+    return item
+
+
+def _diff_gap(old, old_start, old_end, new, new_start, new_end, blocks):
+    """Appends the runs of matching lines between old[old_start:old_end] and
+    new[new_start:new_end] to blocks, in order.
+
+    Lines that only appear on one side can't match anything, so they're
+    left out of the search. When a gap has been rewritten, that's most of
+    it.
+    """
+    old_lines = set(old[old_start:old_end])
+    new_lines = set(new[new_start:new_end])
+    old_indexes = [index for index in xrange(old_start, old_end) if old[index] in new_lines]
+    new_indexes = [index for index in xrange(new_start, new_end) if new[index] in old_lines]
+
+    if (len(old_indexes) == old_end - old_start
+            and len(new_indexes) == new_end - new_start):
+        _myers_blocks(old, old_start, old_end, new, new_start, new_end, blocks)
+        return
+
+    kept_old = [old[index] for index in old_indexes]
+    kept_new = [new[index] for index in new_indexes]
+    kept_blocks = []
+    _myers_blocks(kept_old, 0, len(kept_old), kept_new, 0, len(kept_new), kept_blocks)
+
+    # Runs of kept lines can have left out lines between them, so go back
+    # one line at a time. _merge_blocks joins them up again.
+    for kept_i, kept_j, size in kept_blocks:
+        for offset in xrange(size):
+            blocks.append((old_indexes[kept_i + offset], new_indexes[kept_j + offset], 1))
+
+
+def _myers_blocks(old, old_start, old_end, new, new_start, new_end, blocks,
+                  max_cost=_MAX_COST):
+    """Appends the runs of matching lines in the shortest edit between
+    old[old_start:old_end] and new[new_start:new_end] to blocks, in order.
+
+    Splits the problem in two at the middle of the shortest edit, and
+    recurses on each half, so it only needs linear space. If the middle
+    can't be found within max_cost changes from each end, nothing in between
+    is matched up.
+    """
+    # Matching lines at either end don't need to go through the search.
+    start = old_start
+    while old_start < old_end and new_start < new_end and old[old_start] == new[new_start]:
+        old_start += 1
+        new_start += 1
+    if old_start > start:
+        blocks.append((start, new_start - (old_start - start), old_start - start))
+
+    suffix = 0
+    while (old_start < old_end - suffix and new_start < new_end - suffix
+           and old[old_end - 1 - suffix] == new[new_end - 1 - suffix]):
+        suffix += 1
+
+    old_end -= suffix
+    new_end -= suffix
+    if old_start < old_end and new_start < new_end:
+        snake = _middle_snake(old, old_start, old_end, new, new_start, new_end, max_cost)
+        if snake is not None:
+            snake_old_start, snake_new_start, snake_old_end, snake_new_end = snake
+            _myers_blocks(
+                old, old_start, snake_old_start, new, new_start, snake_new_start, blocks, max_cost)
+            if snake_old_end > snake_old_start:
+                blocks.append((snake_old_start, snake_new_start, snake_old_end - snake_old_start))
+            _myers_blocks(
+                old, snake_old_end, old_end, new, snake_new_end, new_end, blocks, max_cost)
+
+    if suffix:
+        blocks.append((old_end, new_end, suffix))
+
+
+def _middle_snake(old, old_start, old_end, new, new_start, new_end, max_cost):
+    """Finds the run of matching lines (possibly empty) in the middle of the
+    shortest edit, by searching forwards from the start and backwards from
+    the end at the same time until they meet.
+
+    returns the (old, new) positions of its start and its end, or None if
+    the searches don't meet within max_cost changes each
+    """
+    old_count = old_end - old_start
+    new_count = new_end - new_start
+    delta = old_count - new_count
+    odd = delta % 2 == 1
+    max_d = (old_count + new_count + 1) // 2
+
+    # forward[offset + k] is how far along old the forward search has got on
+    # diagonal k (where k = old position - new position). backward is the
+    # same, counting from the ends.
+    offset = max_d + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in xrange(min(max_d, max_cost) + 1):
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            snake_x, snake_y = x, y
+            while x < old_count and y < new_count and old[old_start + x] == new[new_start + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+
+            if odd and delta - (d - 1) <= k <= delta + (d - 1):
+                if x + backward[offset + delta - k] >= old_count:
+                    return (old_start + snake_x, new_start + snake_y,
+                            old_start + x, new_start + y)
+
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            snake_x, snake_y = x, y
+            while (x < old_count and y < new_count
+                   and old[old_end - 1 - x] == new[new_end - 1 - y]):
+                x += 1
+                y += 1
+            backward[offset + k] = x
+
+            if not odd and -d <= delta - k <= d:
+                if x + forward[offset + delta - k] >= old_count:
+                    return (old_end - x, new_end - y,
+                            old_end - snake_x, new_end - snake_y)
+
+    if max_d > max_cost:
+        return None
+    raise AssertionError("the searches never met")
+
+
+def _opcodes_from_blocks(blocks, old_count, new_count):
+    """Turns runs of matching lines into opcodes, like
+    difflib.SequenceMatcher.get_opcodes does."""
+    opcodes = []
+    i = j = 0
+    for block_i, block_j, size in _merge_blocks(blocks):
+        if i < block_i and j < block_j:
+            opcodes.append(('replace', i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(('delete', i, block_i, j, block_j))
+        elif j < block_j:
+            opcodes.append(('insert', i, block_i, j, block_j))
+        if size:
+            opcodes.append(('equal', block_i, block_i + size, block_j, block_j + size))
+        i = block_i + size
+        j = block_j + size
+
+    if i < old_count and j < new_count:
+        opcodes.append(('replace', i, old_count, j, new_count))
+    elif i < old_count:
+        opcodes.append(('delete', i, old_count, j, new_count))
+    elif j < new_count:
+        opcodes.append(('insert', i, old_count, j, new_count))
+    return opcodes
+
+
+def _merge_blocks(blocks):
+    """Joins up runs that follow on from each other, and drops empty ones."""
+    merged = []
+    for block_i, block_j, size in blocks:
+        if not size:
+            continue
+        if merged:
+            last_i, last_j, last_size = merged[-1]
+            if last_i + last_size == block_i and last_j + last_size == block_j:
+                merged[-1] = (last_i, last_j, last_size + size)
+                continue
+        merged.append((block_i, block_j, size))
+    return merged
+
+
+def _grouped_opcodes(opcodes, n=3):
+    """Splits opcodes into hunks with up to n lines of context, like
+    difflib.SequenceMatcher.get_grouped_opcodes."""
+    if not opcodes:
+        opcodes = [('equal', 0, 1, 0, 1)]
+    opcodes = list(opcodes)
+    if opcodes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if opcodes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        # a long run of unchanged lines ends the hunk
+        if tag == 'equal' and i2 - i1 > n + n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _format_range(start, stop):
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '%d' % (beginning,)
+    if not length:
+        beginning -= 1
+    return '%d,%d' % (beginning, length)
+
+
+def _format_unified_diff(old, new, opcodes):
+    started = False
+    for group in _grouped_opcodes(opcodes):
+        if not started:
+            started = True
+            yield '--- old'
+            yield '+++ new'
+
+        first, last = group[0], group[-1]
+        yield '@@ -%s +%s @@' % (_format_range(first[1], last[2]), _format_range(first[3], last[4]))
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in old[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in old[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in new[j1:j2]:
+                    yield '+' + line
@@ -0,0 +1,162 @@
+import hashlib
+import marshal
+import os
+import tempfile
+
+import config
+from models import OrgHeading
+from models import OrgTree
+from parser import parse_buffer
+
+
+# Bump this when the cached format, or what the parser produces, changes.
+CACHE_FORMAT_VERSION = 2
+
+
+class ParseCache(object):
+
+    """Keeps parsed OrgTrees in a directory, so the same file contents are
+    only parsed once.
+
+    Usage:
+        parse_cache = ParseCache('/tmp/org-mode-diff-cache')
+        org_tree = parse_cache.parse_path('notes.org')
+
+    Trees are keyed by a hash of the file's contents and of the settings that
+    change how it's parsed (config.status_values). When the cache holds more
+    than max_bytes, the least recently used trees are removed.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = config.parse_cache_max_bytes if max_bytes is None else max_bytes
+        # roughly how many bytes the directory holds, or None until it's
+        # been looked at
+        self._total_bytes = None
+
+    def parse_path(self, path):
+        # Hash and parse the same bytes, so a file that changes in between
+        # can't be cached under the wrong key.
+        with open(path) as org_file:
+            return self.parse_buffer(org_file.read())
+
+    def parse_buffer(self, buffer):
+        key = self._key(hashlib.sha1(buffer))
+        org_tree = self.get(key)
+        if org_tree is None:
+            org_tree = parse_buffer(buffer)
+            self.put(key, org_tree)
+        return org_tree
+
+    def _key(self, content_digest):
+        content_digest.update(repr((CACHE_FORMAT_VERSION, config.status_values)))
+        return content_digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.orgtree')
+
+    def get(self, key):
+        """Returns the OrgTree stored under key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                org_tree = _org_tree_from_nodes(marshal.load(cache_file))
+        except (IOError, EOFError, ValueError, TypeError, IndexError):
+            # missing, or not something we wrote
+            return None
+
+        # mark it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return org_tree
+
+    def put(self, key, org_tree):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # Write it under another name first, so no one reads half of it.
+        handle, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as cache_file:
+                marshal.dump(_nodes_from_org_tree(org_tree), cache_file)
+                size = cache_file.tell()
+            os.rename(temporary_path, self._path(key))
+        except Exception:
+            os.remove(temporary_path)
+            raise
+
+        # Only list the directory when it might be too big.
+        if self._total_bytes is not None:
+            self._total_bytes += size
+        if self._total_bytes is None or self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Removes the least recently used trees until the directory holds
+        at most max_bytes."""
+        entries = []
+        total_bytes = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.orgtree'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total_bytes += stat.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total_bytes -= size
+
+        self._total_bytes = total_bytes
+
+
+def _nodes_from_org_tree(org_tree):
+    """Flattens an OrgTree into a list of its nodes, in the order they appear
+    in the file, as plain tuples that marshal can write."""
+    nodes = []
+    stack = [org_tree]
+    while stack:
+        node = stack.pop()
+        nodes.append((
+            None if node.orgheading is None else tuple(node.orgheading),
+            node.properties,
+            node.text_content,
+            node.scheduled,
+            node.deadline,
+            len(node.subtrees),
+        ))
+        stack.extend(reversed(node.subtrees))
+    return nodes
+
+
+def _org_tree_from_nodes(nodes):
+    """The reverse of _nodes_from_org_tree."""
+    # Going backwards, each node's subtrees have already been built, and the
+    # first of them is on the top of the stack.
+    stack = []
+    for orgheading, properties, text_content, scheduled, deadline, subtree_count in reversed(nodes):
+        subtrees = tuple(stack.pop() for _ in xrange(subtree_count))
+        org_tree = OrgTree(
+            orgheading=None if orgheading is None else OrgHeading(*orgheading),
+            properties=properties,
+            text_content=text_content,
+            subtrees=subtrees,
+            scheduled=scheduled,
+            deadline=deadline,
+        )
+        # fingerprint it bottom-up, like the parser does
+        org_tree.fingerprint
+        stack.append(org_tree)
+    return stack.pop()
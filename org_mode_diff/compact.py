@@ -0,0 +1,251 @@
+import array
+
+from models import OrgHeading
+from models import OrgTree
+from models import fingerprint_org_tree
+from parser import OrgModeStackParser
+
+
+_FINGERPRINT_SIZE = 20  # bytes in a SHA-1 digest
+_NONE = -1  # id of a missing value
+
+
+class _Table(object):
+
+    """A list of distinct values, each stored once and referred to by its
+    position."""
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def id_of(self, value):
+        if value is None:
+            return _NONE
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def value_of(self, value_id):
+        if value_id == _NONE:
+            return None
+        return self.values[value_id]
+
+    def seal(self):
+        """Drops the lookup dictionary, once nothing more will be added."""
+        self._ids = None
+
+
+class CompactOrgDocument(object):
+
+    """Stores every node of a parsed org-mode file in columns, rather than as
+    a tree of OrgTrees.
+
+    Nodes are numbered in the order they appear in the file, with the
+    top-level as node 0, so a node's subtrees are the nodes after it up to its
+    subtree_end. Each column is an array with one entry per node. Strings
+    (titles, TODO keywords, text, ...), tags and properties are stored once in
+    shared tables, and the columns hold their ids.
+
+    Use CompactOrgModeParser to build one, and CompactOrgTree to look at it.
+    """
+
+    def __init__(self):
+        self.star_counts = array.array('H')
+        self.parents = array.array('i')
+        self.subtree_ends = array.array('i')
+        self.title_ids = array.array('i')
+        self.priority_ids = array.array('i')
+        self.todo_ids = array.array('i')
+        self.tags_ids = array.array('i')
+        self.properties_ids = array.array('i')
+        self.text_content_ids = array.array('i')
+        self.scheduled_ids = array.array('i')
+        self.deadline_ids = array.array('i')
+        self.fingerprints = bytearray()
+
+        self.strings = _Table()
+        self.tags = _Table()
+        self.properties = _Table()
+
+    def __len__(self):
+        return len(self.star_counts)
+
+    def add_heading(self, org_header, parent):
+        """Adds a node for a heading (or the top-level if org_header is None)
+        whose lines haven't been read yet. Returns its index."""
+        index = len(self.star_counts)
+        strings = self.strings
+
+        if org_header is None:
+            self.star_counts.append(0)
+            self.title_ids.append(_NONE)
+            self.priority_ids.append(_NONE)
+            self.todo_ids.append(_NONE)
+            self.tags_ids.append(_NONE)
+        else:
+            self.star_counts.append(org_header.star_count)
+            self.title_ids.append(strings.id_of(org_header.title))
+            self.priority_ids.append(strings.id_of(org_header.priority))
+            self.todo_ids.append(strings.id_of(org_header.todo))
+            self.tags_ids.append(self.tags.id_of(org_header.tags))
+
+        self.parents.append(parent)
+        self.subtree_ends.append(_NONE)
+        self.properties_ids.append(_NONE)
+        self.text_content_ids.append(_NONE)
+        self.scheduled_ids.append(_NONE)
+        self.deadline_ids.append(_NONE)
+        self.fingerprints.extend(b'\0' * _FINGERPRINT_SIZE)
+
+        return index
+
+    def finish_heading(self, index, properties, text_content, scheduled, deadline):
+        """Fills in the rest of a node, once all its lines and subtrees have
+        been read."""
+        self.subtree_ends[index] = len(self.star_counts)
+        self.properties_ids[index] = self.properties.id_of(properties)
+        self.text_content_ids[index] = self.strings.id_of(text_content)
+        self.scheduled_ids[index] = self.strings.id_of(scheduled)
+        self.deadline_ids[index] = self.strings.id_of(deadline)
+
+        start = index * _FINGERPRINT_SIZE
+        self.fingerprints[start:start + _FINGERPRINT_SIZE] = fingerprint_org_tree(
+            CompactOrgTree(self, index))
+
+    def seal(self):
+        self.strings.seal()
+        self.tags.seal()
+        self.properties.seal()
+
+    def subtree_indexes(self, index):
+        subtree_ends = self.subtree_ends
+        end = subtree_ends[index]
+        subtree_index = index + 1
+        while subtree_index < end:
+            yield subtree_index
+            subtree_index = subtree_ends[subtree_index]
+
+
+class CompactOrgTree(object):
+
+    """A node of a CompactOrgDocument, with the same attributes as an OrgTree,
+    so it can be diffed like one.
+
+    Its attributes are looked up in the document each time, and subtrees
+    returns new CompactOrgTrees, so these are cheap to make and throw away.
+    """
+
+    __slots__ = ('document', 'index')
+
+    def __init__(self, document, index):
+        self.document = document
+        self.index = index
+
+    def __repr__(self):
+        return 'CompactOrgTree(%r)' % (self.to_org_tree(),)
+
+    def __reduce__(self):
+        # Pickling the document would copy the whole file, so send just this
+        # node and its subtrees, as OrgTrees.
+        return (OrgTree, tuple(self.to_org_tree()))
+
+    @property
+    def orgheading(self):
+        document = self.document
+        index = self.index
+        if index == 0:
+            return None
+
+        strings = document.strings
+        return OrgHeading(
+            star_count=document.star_counts[index],
+            title=strings.value_of(document.title_ids[index]),
+            priority=strings.value_of(document.priority_ids[index]),
+            todo=strings.value_of(document.todo_ids[index]),
+            tags=document.tags.value_of(document.tags_ids[index]),
+        )
+
+    @property
+    def properties(self):
+        return self.document.properties.value_of(self.document.properties_ids[self.index])
+
+    @property
+    def text_content(self):
+        return self.document.strings.value_of(self.document.text_content_ids[self.index])
+
+    @property
+    def scheduled(self):
+        return self.document.strings.value_of(self.document.scheduled_ids[self.index])
+
+    @property
+    def deadline(self):
+        return self.document.strings.value_of(self.document.deadline_ids[self.index])
+
+    @property
+    def subtrees(self):
+        document = self.document
+        return tuple(
+            CompactOrgTree(document, subtree_index)
+            for subtree_index in document.subtree_indexes(self.index))
+
+    @property
+    def parent(self):
+        parent = self.document.parents[self.index]
+        if parent == _NONE:
+            return None
+        return CompactOrgTree(self.document, parent)
+
+    @property
+    def fingerprint(self):
+        start = self.index * _FINGERPRINT_SIZE
+        return str(self.document.fingerprints[start:start + _FINGERPRINT_SIZE])
+
+    def to_org_tree(self):
+        """Copies this node and its subtrees into OrgTrees."""
+        return OrgTree(
+            orgheading=self.orgheading,
+            properties=self.properties,
+            text_content=self.text_content,
+            subtrees=tuple(subtree.to_org_tree() for subtree in self.subtrees),
+            scheduled=self.scheduled,
+            deadline=self.deadline,
+        )
+
+
+class CompactOrgModeParser(OrgModeStackParser):
+
+    """Parser that reads the same documents as OrgModeStackParser, but stores
+    them in a CompactOrgDocument instead of building OrgTrees.
+
+    flush returns the top-level CompactOrgTree.
+    """
+
+    def __init__(self, intern_table=None):
+        self.document = CompactOrgDocument()
+        OrgModeStackParser.__init__(self, intern_table)
+
+    def _start_heading(self, org_header):
+        heading_parser = OrgModeStackParser._start_heading(self, org_header)
+        parent = self.stack[-1].index if self.stack else _NONE
+        heading_parser.index = self.document.add_heading(org_header, parent)
+        return heading_parser
+
+    def _finish_heading(self, heading_parser):
+        self.document.finish_heading(
+            heading_parser.index,
+            properties=tuple(sorted(heading_parser.properties.items())),
+            text_content="".join(heading_parser.content_lines),
+            scheduled=heading_parser.scheduled,
+            deadline=heading_parser.deadline,
+        )
+        # Unlike OrgTrees, there's nothing to keep in the parent's subtrees,
+        # so OrgModeStackParser doesn't add anything.
+        return None
+
+    def flush(self):
+        OrgModeStackParser.flush(self)
+        self.document.seal()
+        return CompactOrgTree(self.document, 0)
@@ -11,3 +11,17 @@ status_values = [
 ]
 
 similarity_ratio_requirements = 0.75
+
+# How many sibling alignments to remember while diffing a pair of files.
+# The cache is emptied at the start of every diff.
+alignment_cache_size = 1024
+
+# How many headings to keep precomputed similarity data for while diffing.
+similarity_matcher_cache_size = 1024
+
+# The most bytes of parsed trees to keep in a parse cache directory.
+parse_cache_max_bytes = 256 * 1024 * 1024
+
+# How to diff the text under a heading: 'difflib', or 'myers' for long texts
+# with many repeated lines. See bodydiff.unified_diff.
+body_diff_engine = 'difflib'
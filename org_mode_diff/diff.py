@@ -1,47 +1,156 @@
-import difflib
+import collections
+import hashlib
+import itertools
+import multiprocessing
+import sys
 
 import config
-from helpers import smart_zip
-from helpers import _sequence_similarity_ratio
+import stats
+from bodydiff import unified_diff
+from helpers import anchored_zip
+from helpers import clear_caches
+from helpers import sequences_are_similar
 from printer import output_org_header
 from printer import output_org
 from models import getattrs_from_diff
 from models import DiffTuple
 from models import DiffResult
+from models import same_org_tree
 
 def flatten_list_of_lists(lists):
-    return sum(lists, [])
+    return list(itertools.chain.from_iterable(lists))
 
 
-def print_diff(diff):
+def print_diff(diff, out=None, encoding='utf-8'):
+    """Writes out each DiffResult as soon as it's available, to out or to
+    sys.stdout.
+
+    encoding -- how to encode the text of files that were parsed into
+        unicode (with parse_file's encoding)
+    """
+    out = out or sys.stdout
     for item in diff:
-        print " ".join((item.prefix, str(item.string)))
+        _write_diff_result(item, out, encoding)
+
+
+@stats.timed('output')
+def _write_diff_result(item, out, encoding):
+    string = item.string
+    if isinstance(string, TextDiff):
+        string = string.text()
+    elif not isinstance(string, basestring):
+        string = str(string)
+
+    line = " ".join((item.prefix, string)) + "\n"
+    if isinstance(line, unicode):
+        line = line.encode(encoding)
+    out.write(line)
 
 
-def struct_diff(diff_tuple, headers_only, supress_output=False):
+def struct_diff(diff_tuple, headers_only, supress_output=False, jobs=1, detect_moves=False,
+                summary=False):
     """Compute the diff between two proceesd org files. Prints the diff of the result
 
     :param old: the previous org file
     :param new: the new org file
+    :param jobs: how many processes to diff top-level headings in
+    :param detect_moves: report headings that moved to another parent as
+        moved, rather than as removed and added
+    :param summary: give how many lines each text had before and after,
+        rather than diffing it (see summarize_diff)
 
-    :returns: None
+    :returns: the list of DiffResults
     """
 
-    diff = []
-
-    if not headers_only:
-        diff.append(
-            diff_strings(getattrs_from_diff(diff_tuple, "text_content")))
-
-    for subtree_diff_pair in pair_up_subtrees(getattrs_from_diff(diff_tuple, "subtrees")):
-        diff.extend(diff_org_tree(subtree_diff_pair, headers_only))
+    diff = list(iter_struct_diff(diff_tuple, headers_only, jobs, detect_moves, summary))
 
     if not supress_output:
-        print_diff(filter(None, diff))
+        print_diff(diff)
 
     return diff
 
 
+def iter_struct_diff(diff_tuple, headers_only, jobs=1, detect_moves=False, summary=False):
+    """Like struct_diff, but yields each DiffResult as soon as it's worked
+    out, and doesn't print anything."""
+    diff = _iter_struct_diff(diff_tuple, headers_only, jobs, detect_moves, summary)
+    return summarize_diff(diff) if summary else diff
+
+
+def _iter_struct_diff(diff_tuple, headers_only, jobs, detect_moves, summary):
+
+    # Alignments and similarity data are only reused within a single diff.
+    clear_caches()
+
+    moves = MoveIndex(diff_tuple.old, diff_tuple.new) if detect_moves else None
+
+    if not headers_only:
+        text_diff = diff_strings(getattrs_from_diff(diff_tuple, "text_content"))
+        if text_diff:
+            yield text_diff
+
+    subtree_diff_pairs = pair_up_subtrees(getattrs_from_diff(diff_tuple, "subtrees"))
+
+    if jobs > 1:
+        subtree_diffs = _diff_org_trees_in_parallel(
+            subtree_diff_pairs, headers_only, jobs, moves, summary)
+    else:
+        subtree_diffs = (
+            iter_diff_org_tree(subtree_diff_pair, headers_only, moves)
+            for subtree_diff_pair in subtree_diff_pairs)
+
+    for subtree_diff in subtree_diffs:
+        for diff_result in subtree_diff:
+            yield diff_result
+
+
+# The MoveIndex of the diff a worker process is helping with
+_worker_moves = None
+
+
+def _start_worker(moves):
+    global _worker_moves
+    _worker_moves = moves
+
+
+def _diff_org_tree_job(job):
+    org_tree_diff_tuple, headers_only, summary = job
+    diff = iter_diff_org_tree(org_tree_diff_tuple, headers_only, _worker_moves)
+    # Summarize here, otherwise sending the text diffs back would work them
+    # all out.
+    return list(summarize_diff(diff) if summary else diff)
+
+
+def _diff_org_trees_in_parallel(org_tree_diff_tuples, headers_only, jobs, moves=None,
+                                summary=False):
+    """Diffs each pair of OrgTrees in a pool of processes, yielding their
+    lists of DiffResults in the same order as the pairs."""
+    # The MoveIndex covers the whole of both trees, so it's sent to each
+    # process once, rather than with every pair.
+    pool = multiprocessing.Pool(jobs, initializer=_start_worker, initargs=(moves,))
+    try:
+        pending = []
+        for org_tree_diff_tuple in org_tree_diff_tuples:
+            # Only changed subtrees are worth sending to another process.
+            if (org_tree_diff_tuple.old is None
+                    or org_tree_diff_tuple.new is None
+                    or same_org_tree(*org_tree_diff_tuple)):
+                pending.append(diff_org_tree(org_tree_diff_tuple, headers_only, moves))
+            else:
+                pending.append(pool.apply_async(
+                    _diff_org_tree_job, ((org_tree_diff_tuple, headers_only, summary),)))
+        pool.close()
+
+        for diff_results in pending:
+            if isinstance(diff_results, list):
+                yield diff_results
+            else:
+                yield diff_results.get()
+        pool.join()
+    finally:
+        pool.terminate()
+
+
 def simple_diff(diff_tuple):
     old, new = diff_tuple
 
@@ -71,7 +180,7 @@ def diff_tuples_or_string(diff_tuple):
     if old is None:
         return [DiffResult('diff', "+", new)]
 
-    if isinstance(old, str) or isinstance(new, str):
+    if isinstance(old, basestring) or isinstance(new, basestring):
         return simple_diff(diff_tuple)
     else:
         # If this is a nested structure, recurse
@@ -91,15 +200,81 @@ def diff_strings(diff_tuple):
         if new is None:
             new = ""
 
-        return DiffResult(
-            'diff',
-            '',
-            '\n'.join(difflib.unified_diff(
-                old.split('\n'),
-                new.split('\n'),
-                fromfile="old",
-                tofile="new",
-                lineterm="")))
+        return DiffResult('diff', '', TextDiff(old, new))
+
+
+def _count_lines(text):
+    return text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+
+
+class TextDiff(object):
+
+    """The unified diff of two texts. It's only worked out the first time
+    it's asked for, so a diff that's never printed costs nothing.
+
+    It compares equal to the string of the diff. If the texts are unicode,
+    so is the diff, and str() encodes it as UTF-8.
+    """
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self._diff = None
+        self._line_counts = None
+
+    def text(self):
+        """Returns the diff, as a str or unicode like the texts."""
+        if self._diff is None:
+            self._diff = _unified_diff(self.old, self.new)
+        return self._diff
+
+    def __str__(self):
+        diff = self.text()
+        return diff.encode('utf-8') if isinstance(diff, unicode) else diff
+
+    def __repr__(self):
+        return repr(self.text())
+
+    def __eq__(self, other):
+        if isinstance(other, TextDiff):
+            other = other.text()
+        return self.text() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.text())
+
+    def __getstate__(self):
+        # When it's sent back from another process, do the work there.
+        return self.text(), self.line_counts()
+
+    def __setstate__(self, state):
+        self._diff, self._line_counts = state
+        self.old = self.new = None
+
+    def line_counts(self):
+        """Returns the number of lines in the old and new texts."""
+        if self._line_counts is None:
+            self._line_counts = (_count_lines(self.old), _count_lines(self.new))
+        return self._line_counts
+
+
+@stats.timed('body_diff')
+def _unified_diff(old, new):
+    return '\n'.join(unified_diff(old.split('\n'), new.split('\n')))
+
+
+def summarize_diff(diff):
+    """Replaces each text diff among the DiffResults with how many lines the
+    text had before and after, so no text is ever diffed line by line."""
+    for diff_result in diff:
+        if isinstance(diff_result.string, TextDiff):
+            yield DiffResult(
+                'comment', "#", "text changed: %d -> %d lines" % diff_result.string.line_counts())
+        else:
+            yield diff_result
 
 
 def _simplify_org_tree(tree):
@@ -123,69 +298,197 @@ def org_items_are_similar(old, new):
     if simplified_old == simplified_new:
         return True
     # If they're close enough, we're done here.
-    if _sequence_similarity_ratio(simplified_old, simplified_new) > config.similarity_ratio_requirements:
+    if sequences_are_similar(simplified_old, simplified_new, config.similarity_ratio_requirements):
         return True
 
     return False
 
 
+def _org_tree_fingerprint(tree):
+    return tree.fingerprint
+
+
+@stats.timed('align')
 def pair_up_subtrees(org_tree_list_diff_tuple):
     """Given two lists of OrgTrees, pairs them up"""
-    return tuple(smart_zip(org_tree_list_diff_tuple, org_items_are_similar))
+    # Most subtrees don't change, so pair those up first and only look for
+    # similar subtrees in between them.
+    return tuple(anchored_zip(
+        org_tree_list_diff_tuple, org_items_are_similar, _org_tree_fingerprint))
+
+
+def _star_count(org_tree):
+    return 0 if org_tree.orgheading is None else org_tree.orgheading.star_count
+
+
+def _move_key(org_tree, counts, keys):
+    """Like the fingerprint, but the same wherever the tree is: star counts
+    are left out, apart from how much deeper each subtree is than its parent.
+
+    Counts the key of each subtree under org_tree (however deeply nested) in
+    counts, and records it in keys by fingerprint. Returns org_tree's own.
+    """
+    orgheading = org_tree.orgheading
+    digest = hashlib.sha1(repr((
+        None if orgheading is None else tuple(orgheading)[1:],
+        org_tree.properties,
+        org_tree.text_content,
+        org_tree.scheduled,
+        org_tree.deadline,
+    )))
+    star_count = _star_count(org_tree)
+    for subtree in org_tree.subtrees:
+        subtree_key = _move_key(subtree, counts, keys)
+        counts[subtree_key] += 1
+        keys[subtree.fingerprint] = subtree_key
+        digest.update(repr(_star_count(subtree) - star_count))
+        digest.update(subtree_key)
+    return digest.digest()
+
+
+def _unpaired_subtrees(old_org, new_org):
+    """Pairs up subtrees the same way iter_diff_org_tree does.
+
+    returns the lists of old and new subtrees that are left unpaired
+    """
+    old_unpaired = []
+    new_unpaired = []
+    stack = [DiffTuple(old_org, new_org)]
+    while stack:
+        org_tree_diff_tuple = stack.pop()
+        old, new = org_tree_diff_tuple
+        if same_org_tree(old, new):
+            continue
+        if old is None:
+            new_unpaired.append(new)
+        elif new is None:
+            old_unpaired.append(old)
+        else:
+            stack.extend(pair_up_subtrees(getattrs_from_diff(org_tree_diff_tuple, 'subtrees')))
+    return old_unpaired, new_unpaired
+
 
+class MoveIndex(object):
 
-def diff_org_tree(org_tree_diff_tuple, headers_only):
+    """Finds headings that moved from one place to another between two
+    trees.
+
+    A subtree that appears exactly once in each tree is the same heading,
+    wherever it is, even if it's now more or less deeply nested. So if it's
+    left unpaired in both trees, it must have moved. If it's paired up on
+    one side, the other copy is really added or removed.
+
+    Each tree is walked once, and the subtrees are paired up before the
+    diff. (The alignments are cached, so the diff in this process doesn't
+    work them out again.)
+    """
+
+    def __init__(self, old_org, new_org):
+        old_counts = collections.Counter()
+        old_keys = {}
+        _move_key(old_org, old_counts, old_keys)
+        new_counts = collections.Counter()
+        new_keys = {}
+        _move_key(new_org, new_counts, new_keys)
+
+        def unique_keys(subtrees, keys):
+            return set(
+                key for key in (keys[subtree.fingerprint] for subtree in subtrees)
+                if old_counts[key] == 1 and new_counts[key] == 1)
+
+        old_unpaired, new_unpaired = _unpaired_subtrees(old_org, new_org)
+        moved_keys = unique_keys(old_unpaired, old_keys) & unique_keys(new_unpaired, new_keys)
+
+        # Only the moved subtrees themselves are kept, so it's cheap to send
+        # to other processes.
+        self.fingerprints = frozenset(
+            [subtree.fingerprint for subtree in old_unpaired
+             if old_keys[subtree.fingerprint] in moved_keys] +
+            [subtree.fingerprint for subtree in new_unpaired
+             if new_keys[subtree.fingerprint] in moved_keys])
+
+    def is_moved(self, org_tree):
+        return org_tree.fingerprint in self.fingerprints
+
+
+def diff_org_tree(org_tree_diff_tuple, headers_only, moves=None):
+    return list(iter_diff_org_tree(org_tree_diff_tuple, headers_only, moves))
+
+
+def iter_diff_org_tree(org_tree_diff_tuple, headers_only, moves=None):
+    """Yields the DiffResults of a pair of OrgTrees, and of their subtrees.
+
+    moves -- a MoveIndex of the whole trees, or None to not look for moved
+        headings
+    """
     old = org_tree_diff_tuple.old
     new = org_tree_diff_tuple.new
 
     # either these items are the same...
-    if old == new:
-        return [DiffResult('comment', "#", output_org_header(new.orgheading))]
-    # or one of them is new...
+    if same_org_tree(old, new):
+        yield DiffResult('comment', "#", output_org_header(new.orgheading))
+        return
+    # or one of them is new, or has moved to or from somewhere else...
     if old is None:
-        return [DiffResult('diff', "+", output_org_header(new.orgheading))]
+        if moves is not None and moves.is_moved(new):
+            yield DiffResult('comment', "[moved here]", output_org_header(new.orgheading))
+        else:
+            yield DiffResult('diff', "+", output_org_header(new.orgheading))
+        return
     elif new is None:
-        return [DiffResult('diff', "-", output_org_header(old.orgheading))]
+        if moves is not None and moves.is_moved(old):
+            yield DiffResult('comment', "[moved away]", output_org_header(old.orgheading))
+        else:
+            yield DiffResult('diff', "-", output_org_header(old.orgheading))
+        return
 
     # or something more subtle has changed
 
-    diff_results = [
-        DiffResult('comment', "[updated]", output_org_header(new.orgheading))]
+    yield DiffResult('comment', "[updated]", output_org_header(new.orgheading))
 
-    diff_results.extend(diff_tuples_or_string(
-        getattrs_from_diff(org_tree_diff_tuple, 'orgheading')))
+    for diff_result in diff_tuples_or_string(
+            getattrs_from_diff(org_tree_diff_tuple, 'orgheading')):
+        yield diff_result
 
-    diff_results.extend(diff_properties(
-        getattrs_from_diff(org_tree_diff_tuple, 'properties')))
+    for diff_result in diff_properties(
+            getattrs_from_diff(org_tree_diff_tuple, 'properties')):
+        yield diff_result
 
     if not headers_only:
-        diff_results.append(diff_strings(
-            getattrs_from_diff(org_tree_diff_tuple, 'text_content')))
+        text_diff = diff_strings(
+            getattrs_from_diff(org_tree_diff_tuple, 'text_content'))
+        if text_diff:
+            yield text_diff
 
     schedule_info = diff_tuples_or_string(
         getattrs_from_diff(org_tree_diff_tuple, 'scheduled'))
     if schedule_info:
-        diff_results.append(DiffResult('comment', "#", "scheduled"))
-        diff_results.extend(schedule_info)
+        yield DiffResult('comment', "#", "scheduled")
+        for diff_result in schedule_info:
+            yield diff_result
 
     deadline_info = diff_tuples_or_string(
         getattrs_from_diff(org_tree_diff_tuple, 'deadline'))
     if schedule_info:
-        diff_results.append(DiffResult('comment', "#", "deadline"))
-        diff_results.extend(deadline_info)
+        yield DiffResult('comment', "#", "deadline")
+        for diff_result in deadline_info:
+            yield diff_result
 
     for diff_tuple in pair_up_subtrees(getattrs_from_diff(org_tree_diff_tuple, 'subtrees')):
-        diff_results.extend(diff_org_tree(diff_tuple, headers_only))
-
-    return filter(None, diff_results)
+        for diff_result in iter_diff_org_tree(diff_tuple, headers_only, moves):
+            yield diff_result
 
 
 def diff_properties(diff_tuple):
-    def get_property_key(old, new):
-        return old[0] == new[0]
-
-    return flatten_list_of_lists(
-        diff_tuples_or_string(property_diff_tuple)
-        for property_diff_tuple
-        in smart_zip(diff_tuple, similarity_function=get_property_key)
-    )
+    """Diffs two properties tuples as dictionaries, key by key, in order of key."""
+    old = dict(diff_tuple.old or ())
+    new = dict(diff_tuple.new or ())
+
+    diff_results = []
+    for key in sorted(set(old).union(new)):
+        old_property = (key, old[key]) if key in old else None
+        new_property = (key, new[key]) if key in new else None
+        diff_results.extend(
+            diff_tuples_or_string(DiffTuple(old_property, new_property)))
+
+    return diff_results
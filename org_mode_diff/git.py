@@ -0,0 +1,154 @@
+import os
+import posixpath
+import subprocess
+
+from diff import struct_diff
+from models import DiffTuple
+from parser import parse_buffer
+
+
+# Revision name for the files as they are on disk, rather than in git
+WORKTREE = 'WORKTREE'
+
+
+class GitException(Exception):
+    pass
+
+
+class GitBlobReader(object):
+
+    """Reads files as they were at some revision of a git repository.
+
+    Usage:
+        with GitBlobReader() as reader:
+            contents = reader.read('master', 'notes.org')
+
+    All the reads go through one `git cat-file --batch` process, which is
+    started on the first read and kept until the reader is closed. Nothing is
+    written to disk.
+
+    repository -- a directory in the repository. Paths are relative to it.
+    """
+
+    def __init__(self, repository='.'):
+        self.repository = repository
+        self._prefix = None
+        self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+    def _git_path(self, path):
+        """Turns a path relative to self.repository into one relative to the
+        top of the repository, which is what git expects after a revision."""
+        if self._prefix is None:
+            self._prefix = subprocess.check_output(
+                ['git', 'rev-parse', '--show-prefix'], cwd=self.repository).strip()
+
+        git_path = posixpath.normpath(
+            posixpath.join(self._prefix, path.replace(os.sep, '/')))
+        if git_path.startswith('../'):
+            raise GitException("%s is outside the repository" % (path,))
+        return git_path
+
+    def _cat_file(self):
+        if self._process is None:
+            self._process = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                cwd=self.repository,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE)
+        return self._process
+
+    def check_revision(self, revision):
+        """Raises GitException if revision isn't a commit in the repository.
+
+        cat-file says a file is missing whether the path or the revision
+        doesn't exist, so check the revision first.
+        """
+        if revision == WORKTREE:
+            return
+        with open(os.devnull, 'w') as devnull:
+            returncode = subprocess.call(
+                ['git', 'rev-parse', '--verify', '--quiet', revision + '^{commit}'],
+                cwd=self.repository,
+                stdout=devnull)
+        if returncode != 0:
+            raise GitException("%s isn't a revision" % (revision,))
+
+    def read(self, revision, path):
+        """Returns the contents of path at revision, or None if it doesn't
+        exist there.
+
+        revision -- anything git understands as a revision, or WORKTREE
+        """
+        if revision == WORKTREE:
+            full_path = os.path.join(self.repository, path)
+            if not os.path.exists(full_path):
+                return None
+            with open(full_path) as org_file:
+                return org_file.read()
+
+        process = self._cat_file()
+        process.stdin.write("%s:%s\n" % (revision, self._git_path(path)))
+        process.stdin.flush()
+
+        # Either "<object name> missing" or "<sha> <type> <size>", followed
+        # by the contents and a newline.
+        header = process.stdout.readline()
+        if not header:
+            raise GitException("git cat-file exited")
+        if header.endswith(" missing\n"):
+            return None
+
+        fields = header.split()
+        if len(fields) != 3:
+            raise GitException(header.strip())
+        _, object_type, size = fields
+        contents = process.stdout.read(int(size))
+        process.stdout.read(1)
+
+        if object_type != 'blob':
+            raise GitException("%s:%s is a %s, not a file" % (revision, path, object_type))
+        return contents
+
+
+def iter_revision_diff(paths, old_revision, new_revision, headers_only, repository='.',
+                       parse_cache=None, detect_moves=False, summary=False, jobs=1):
+    """Diffs each path between two revisions, using one GitBlobReader.
+
+    A path that doesn't exist at one of the revisions is diffed against an
+    empty file.
+
+    parse_cache -- a ParseCache to parse the files through, or None
+    detect_moves, summary, jobs -- as in struct_diff
+
+    yields (path, list of DiffResults), in the same order as paths
+    """
+    parse = parse_buffer if parse_cache is None else parse_cache.parse_buffer
+
+    with GitBlobReader(repository) as reader:
+        reader.check_revision(old_revision)
+        reader.check_revision(new_revision)
+
+        for path in paths:
+            old_contents = reader.read(old_revision, path)
+            new_contents = reader.read(new_revision, path)
+            if old_contents is None and new_contents is None:
+                raise GitException(
+                    "%s is in neither %s nor %s" % (path, old_revision, new_revision))
+
+            old_org = parse(old_contents or "")
+            new_org = parse(new_contents or "")
+            yield path, struct_diff(
+                DiffTuple(old_org, new_org), headers_only, supress_output=True, jobs=jobs,
+                detect_moves=detect_moves, summary=summary)
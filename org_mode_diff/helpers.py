@@ -1,26 +1,124 @@
+import array
+import bisect
 import collections
 import difflib
 import functools
+import sys
 
+import config
+import stats
 from models import DiffTuple
 
 
-def score_zip(zip_result):
-    return -len(zip_result)
+class LRUCache(object):
+    """A mapping that holds at most max_size entries, evicting the least
+    recently used one when it's full.
 
-# From https://wiki.python.org/moin/PythonDecoratorLibrary#Memoize
-def memoize(obj):
-    cache = obj.cache = {}
+    It counts hits, misses and evictions, and keeps a rough (shallow) count of
+    the bytes held by its keys and values, so it can be monitored.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        # re-insert it so it's the most recently used
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self._entries:
+            self._discard(key)
+        elif self.max_size <= 0:
+            return
+
+        while len(self._entries) >= self.max_size:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+        self._entries[key] = value
+        self.bytes += _entry_size(key, value)
+
+    def _discard(self, key):
+        value = self._entries.pop(key)
+        self.bytes -= _entry_size(key, value)
+
+    def clear(self):
+        """Drops every entry. The counters keep going."""
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': self.bytes,
+        }
+
+
+def _entry_size(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+_MISSING = object()
 
-    @functools.wraps(obj)
-    def memoizer(*args, **kwargs):
-        if args not in cache:
-            cache[args] = obj(*args, **kwargs)
-        return cache[args]
-    return memoizer
 
+def memoize(key_function, max_size):
+    """Caches the results of a function in a LRUCache.
 
-@memoize
+    The cache is available as the function's cache attribute.
+
+    key_function -- given the arguments, returns the key to cache them under
+    max_size -- the most results to keep
+    """
+    def decorator(obj):
+        cache = obj.cache = LRUCache(max_size)
+
+        @functools.wraps(obj)
+        def memoizer(*args, **kwargs):
+            key = key_function(*args, **kwargs)
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = obj(*args, **kwargs)
+                cache.put(key, result)
+            return result
+        return memoizer
+    return decorator
+
+
+def _alignment_key(diff_tuple, similarity_function=None):
+    """Keys an alignment by the identity of the items being aligned.
+
+    This is cheap to hash, unlike the items themselves. It's safe because each
+    cached alignment keeps a reference to every item it was keyed by, so those
+    ids can't be reused while it's in the cache.
+    """
+    old, new = diff_tuple
+    return (similarity_function, tuple(map(id, old)), tuple(map(id, new)))
+
+
+@memoize(_alignment_key, config.alignment_cache_size)
 def smart_zip(diff_tuple, similarity_function=None):
     """Does a pairwise sequence alignment.
 
@@ -30,36 +128,195 @@ def smart_zip(diff_tuple, similarity_function=None):
 
     returns a list of 2-tuples
 
+    The alignment is greedy: two items that are similar are always paired
+    up. When they are not, we skip whichever of the old or new item leads to
+    the shorter alignment (the one with the most matches). If they're equal,
+    we lean towards keeping the old.
+
+    This is computed bottom-up over a table of alignment lengths, so it takes
+    O(len(old) * len(new)) time and doesn't recurse. Each pair of items is
+    only compared once.
     """
     if not similarity_function:
         similarity_function = lambda x, y: x == y
 
     old, new = diff_tuple
+    old = tuple(old)
+    new = tuple(new)
+    old_count = len(old)
+    new_count = len(new)
+    stats.count('alignment_cells', old_count * new_count)
+
+    # cells[i][j] is the length of the alignment of old[i:] and new[j:],
+    # shifted left one bit, with the low bit set if old[i] and new[j] are
+    # similar. Lengths are at most old_count + new_count, so they usually fit
+    # in two bytes.
+    typecode = 'H' if (old_count + new_count) * 2 + 1 <= 0xffff else 'I'
+    cells = [None] * old_count + [
+        array.array(typecode, [length << 1 for length in xrange(new_count, -1, -1)])]
+    for i in xrange(old_count - 1, -1, -1):
+        old_item = old[i]
+        below = cells[i + 1]
+        row = array.array(typecode, below)
+        row[new_count] = (old_count - i) << 1
+        for j in xrange(new_count - 1, -1, -1):
+            if similarity_function(old_item, new[j]):
+                row[j] = ((below[j + 1] >> 1) + 1) << 1 | 1
+            else:
+                row[j] = ((min(row[j + 1], below[j]) >> 1) + 1) << 1
+        cells[i] = row
+
+    # Walk the table from the start, replaying the choices made above.
+    result = []
+    i = j = 0
+    while i < old_count and j < new_count:
+        if cells[i][j] & 1:
+            result.append(DiffTuple(old[i], new[j]))
+            i += 1
+            j += 1
+        elif cells[i][j + 1] >> 1 < cells[i + 1][j] >> 1:
+            result.append(DiffTuple(None, new[j]))
+            j += 1
+        else:
+            result.append(DiffTuple(old[i], None))
+            i += 1
+
+    result.extend(DiffTuple(item, None) for item in old[i:])
+    result.extend(DiffTuple(None, item) for item in new[j:])
 
-    if not new:
-        return [DiffTuple(item, None) for item in old]
-    if not old:
-        return [DiffTuple(None, item) for item in new]
+    return result
 
-    old_item = old[0]
-    new_item = new[0]
 
-    if similarity_function(old_item, new_item):
-        return [DiffTuple(old_item, new_item)] + smart_zip(DiffTuple(old[1:], new[1:]), similarity_function)
-    else:
-        skip_old = smart_zip(DiffTuple(old[1:], new), similarity_function)
-        skip_new = smart_zip(DiffTuple(old, new[1:]), similarity_function)
+stats.register_cache('alignments', smart_zip.cache)
 
-        # use the one that found the most number of matches. If they're
-        # equal, we lean towards keeping the old
-        if score_zip(skip_new) > score_zip(skip_old):
-            return [DiffTuple(None, new_item)] + skip_new
+
+def anchored_zip(diff_tuple, similarity_function, anchor_key):
+    """Does the same pairwise sequence alignment as smart_zip, but first pairs
+    up items that are unchanged, so smart_zip only has to align the gaps
+    between them.
+
+    diff_tuple -- diff_tuple containing iterables
+    similarity_function -- as in smart_zip
+    anchor_key -- function returning a key for an item. Items with the same key
+        are identical. Keys that appear exactly once in both old and new are
+        used as anchors, like in patience diff.
+
+    returns a list of 2-tuples
+    """
+    old, new = diff_tuple
+    old = tuple(old)
+    new = tuple(new)
+
+    result = []
+    old_start = new_start = 0
+    for old_index, new_index in find_anchors(old, new, anchor_key):
+        # Most anchors are right next to each other, with nothing to align.
+        if old_index > old_start or new_index > new_start:
+            result.extend(smart_zip(
+                DiffTuple(old[old_start:old_index], new[new_start:new_index]),
+                similarity_function))
+        result.append(DiffTuple(old[old_index], new[new_index]))
+        old_start = old_index + 1
+        new_start = new_index + 1
+
+    result.extend(smart_zip(
+        DiffTuple(old[old_start:], new[new_start:]), similarity_function))
+
+    return result
+
+
+def _unique_key_indexes(items, anchor_key):
+    indexes = {}
+    for index, item in enumerate(items):
+        key = anchor_key(item)
+        indexes[key] = None if key in indexes else index
+    return indexes
+
+
+def find_anchors(old, new, anchor_key):
+    """Returns the (old index, new index) pairs of the largest set of unique
+    keys that appear in the same order in both old and new."""
+    old_indexes = _unique_key_indexes(old, anchor_key)
+    new_indexes = _unique_key_indexes(new, anchor_key)
+
+    candidates = [
+        (old_index, new_indexes[key])
+        for key, old_index in old_indexes.iteritems()
+        if old_index is not None and new_indexes.get(key) is not None
+    ]
+    candidates.sort()
+
+    # Longest increasing subsequence of the new indexes, by patience sorting.
+    # pile_tops[k] is the candidate ending the best run of length k + 1.
+    pile_tops = []
+    pile_top_new_indexes = []
+    previous = [None] * len(candidates)
+    for position, (_, new_index) in enumerate(candidates):
+        pile = bisect.bisect_left(pile_top_new_indexes, new_index)
+        if pile:
+            previous[position] = pile_tops[pile - 1]
+        if pile == len(pile_tops):
+            pile_tops.append(position)
+            pile_top_new_indexes.append(new_index)
         else:
-            return [DiffTuple(old_item, None)] + skip_old
+            pile_tops[pile] = position
+            pile_top_new_indexes[pile] = new_index
+
+    anchors = []
+    position = pile_tops[-1] if pile_tops else None
+    while position is not None:
+        anchors.append(candidates[position])
+        position = previous[position]
+    anchors.reverse()
+
+    return anchors
+
+
+# SequenceMatchers for the strings we've compared against, keyed by that
+# string. A SequenceMatcher keeps what it's worked out about its second
+# sequence, so reusing one only pays for that once.
+_similarity_matchers = LRUCache(config.similarity_matcher_cache_size)
+stats.register_cache('similarity_matchers', _similarity_matchers)
+
+
+def _matcher_for(simplified_new):
+    matcher = _similarity_matchers.get(simplified_new)
+    if matcher is None:
+        matcher = difflib.SequenceMatcher(None, "", simplified_new)
+        _similarity_matchers.put(simplified_new, matcher)
+    return matcher
+
+
+@stats.timed('similarity')
+def sequences_are_similar(simplified_old, simplified_new, ratio_requirement):
+    """Whether the similarity ratio of the two strings is above ratio_requirement.
+
+    The ratio is the one from difflib.SequenceMatcher. Computing it is
+    expensive, so first we check cheaper upper bounds of it and give up as
+    soon as one of them isn't above the requirement.
+    """
+    total_length = len(simplified_old) + len(simplified_new)
+    if not total_length:
+        # two empty strings are identical
+        return 1.0 > ratio_requirement
+
+    # At best, the whole of the shorter string matches. (This is what
+    # real_quick_ratio works out, but without making a SequenceMatcher.)
+    best_ratio = 2.0 * min(len(simplified_old), len(simplified_new)) / total_length
+    if best_ratio <= ratio_requirement:
+        return False
+
+    matcher = _matcher_for(simplified_new)
+    matcher.set_seq1(simplified_old)
+
+    # Only counts the characters they have in common, ignoring their order.
+    if matcher.quick_ratio() <= ratio_requirement:
+        return False
+
+    return matcher.ratio() > ratio_requirement
 
 
-def _sequence_similarity_ratio(simplified_old, simplified_new):
-    """Returns a ratio that represents the similarity between the two strings."""
-    sequence_match = difflib.SequenceMatcher(
-        None, simplified_old, simplified_new)
-    return sequence_match.ratio()
+def clear_caches():
+    """Empties the caches that should only last for one diff."""
+    smart_zip.cache.clear()
+    _similarity_matchers.clear()
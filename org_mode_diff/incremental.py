@@ -0,0 +1,174 @@
+import collections
+
+from parser import ORG_HEADER_REGEX
+from parser import OrgModeStackParser
+
+
+LineEdit = collections.namedtuple('LineEdit', [
+    'start',  # index of the first line to replace
+    'end',  # index after the last line to replace, so start == end inserts
+    'lines',  # list of lines to put in their place
+])
+
+# Where a node's lines are, relative to its parent's. A node's own lines come
+# first, then each of its subtrees' lines in order, so positions are worked
+# out by adding up lengths and nothing needs moving after an edit.
+_Span = collections.namedtuple('_Span', [
+    'head_length',  # number of lines before the first subtree
+    'length',  # number of lines, including the subtrees'
+    'subtrees',  # tuple of _Spans
+])
+
+
+class _SpanParser(OrgModeStackParser):
+
+    """OrgModeStackParser that also works out the _Span of every node."""
+
+    def __init__(self, intern_table=None):
+        self.line_count = 0
+        OrgModeStackParser.__init__(self, intern_table)
+
+    def consume(self, line):
+        OrgModeStackParser.consume(self, line)
+        self.line_count += 1
+
+    def _start_heading(self, org_header):
+        heading_parser = OrgModeStackParser._start_heading(self, org_header)
+        heading_parser.start = self.line_count
+        heading_parser.subtree_spans = []
+        return heading_parser
+
+    def _finish_heading(self, heading_parser):
+        subtree_spans = tuple(heading_parser.subtree_spans)
+        length = self.line_count - heading_parser.start
+        span = _Span(
+            head_length=length - sum(subtree_span.length for subtree_span in subtree_spans),
+            length=length,
+            subtrees=subtree_spans)
+
+        if self.stack[-1] is heading_parser:
+            # the top-level, from flush
+            self.span = span
+        else:
+            self.stack[-1].subtree_spans.append(span)
+        return OrgModeStackParser._finish_heading(self, heading_parser)
+
+
+def _header_star_count(line):
+    """The star count of a header line, or None if it isn't one."""
+    if line[:1] == '*' and ORG_HEADER_REGEX.match(line) is not None:
+        return len(line) - len(line.lstrip('*'))
+    return None
+
+
+def _replace_item(items, index, item):
+    return items[:index] + (item,) + items[index + 1:]
+
+
+def parse_incrementally(lines, intern_table=None):
+    """Parses the lines of an org-mode file, like parse_lines, into an
+    IncrementalParse that can be edited."""
+    lines = list(lines)
+    parser = _SpanParser(intern_table)
+    for line in lines:
+        parser.consume(line)
+    org_tree = parser.flush()
+    return IncrementalParse(lines, org_tree, parser.span, parser.intern_table)
+
+
+class IncrementalParse(object):
+
+    """A parsed org-mode file, along with where each heading's lines are, so
+    that after an edit only the heading around it needs parsing again.
+
+    Usage:
+        parsed = parse_incrementally(lines)
+        parsed = parsed.apply_edits([LineEdit(10, 12, ["new line\\n"])])
+        parsed.org_tree  # the same as parse_lines of the edited lines
+
+    Each edit is parsed again as part of the smallest heading that contains
+    it without changing its header line, and that doesn't end up containing
+    a header with as few stars as its own (which would end it early). The
+    new heading is put into the tree in place of the old one. Everything
+    else is shared with the previous parse, so unchanged OrgTrees stay the
+    same objects.
+
+    An edit to the lines before the first heading, or one that adds a
+    top-level header, is parsed again from scratch.
+    """
+
+    def __init__(self, lines, org_tree, span, intern_table):
+        self.lines = lines
+        self.org_tree = org_tree
+        self.span = span
+        self.intern_table = intern_table
+
+    def apply_edits(self, edits):
+        """Returns a new IncrementalParse with each LineEdit made in order.
+        Each edit's line numbers are after the edits before it."""
+        parsed = self
+        for edit in edits:
+            parsed = parsed._apply_edit(edit)
+        return parsed
+
+    def _apply_edit(self, edit):
+        if not 0 <= edit.start <= edit.end <= len(self.lines):
+            raise ValueError(
+                "Can't replace lines %d to %d of %d" % (edit.start, edit.end, len(self.lines)))
+
+        lines = self.lines[:edit.start] + list(edit.lines) + self.lines[edit.end:]
+        length_change = len(edit.lines) - (edit.end - edit.start)
+
+        # A new header ends any heading with as many stars or more.
+        new_star_counts = [_header_star_count(line) for line in edit.lines]
+        fewest_new_stars = min(
+            [star_count for star_count in new_star_counts if star_count is not None] or [None])
+
+        path = self._enclosing_path(edit.start, edit.end)
+        while path:
+            org_tree, span, start = path[-1][1:]
+            if fewest_new_stars is None or org_tree.orgheading.star_count < fewest_new_stars:
+                break
+            path.pop()
+
+        if not path:
+            return parse_incrementally(lines, self.intern_table)
+
+        # Parse the heading's lines on their own.
+        parser = _SpanParser(self.intern_table)
+        for line in lines[start:start + span.length + length_change]:
+            parser.consume(line)
+        new_org_tree, = parser.flush().subtrees
+        new_span, = parser.span.subtrees
+
+        # Put it in place of the old one, and rebuild the headings above it.
+        parents = [(self.org_tree, self.span)] + [
+            (org_tree, span) for _, org_tree, span, _ in path[:-1]]
+        for (index, _, _, _), (parent_org_tree, parent_span) in reversed(zip(path, parents)):
+            new_org_tree = parent_org_tree._replace(
+                subtrees=_replace_item(parent_org_tree.subtrees, index, new_org_tree))
+            # fingerprint it now, like the parser does
+            new_org_tree.fingerprint
+            new_span = parent_span._replace(
+                length=parent_span.length + length_change,
+                subtrees=_replace_item(parent_span.subtrees, index, new_span))
+
+        return IncrementalParse(lines, new_org_tree, new_span, self.intern_table)
+
+    def _enclosing_path(self, start, end):
+        """Returns the headings that contain lines start to end, apart from
+        their header lines, from the outermost in, as (index in the parent's
+        subtrees, OrgTree, _Span, line number of the header)."""
+        path = []
+        org_tree, span, node_start = self.org_tree, self.span, 0
+        while True:
+            subtree_start = node_start + span.head_length
+            for index, (subtree, subtree_span) in enumerate(zip(org_tree.subtrees, span.subtrees)):
+                subtree_end = subtree_start + subtree_span.length
+                if subtree_start < start and end <= subtree_end:
+                    path.append((index, subtree, subtree_span, subtree_start))
+                    org_tree, span, node_start = subtree, subtree_span, subtree_start
+                    break
+                subtree_start = subtree_end
+            else:
+                return path
@@ -1,6 +1,7 @@
 import collections
+import hashlib
 
-OrgTree = collections.namedtuple('OrgTree', [
+_OrgTreeFields = collections.namedtuple('OrgTree', [
     'orgheading',  # org heading
     'properties',  # dictionary of property name to value
     'text_content',  # string of text contents
@@ -9,6 +10,46 @@ OrgTree = collections.namedtuple('OrgTree', [
     'deadline',
 ])
 
+
+class OrgTree(_OrgTreeFields):
+
+    """A node of a parsed org-mode file.
+
+    Besides its fields, each node has a fingerprint: a hash of its contents and
+    the fingerprints of its subtrees. It's computed the first time it's asked
+    for and then kept, so comparing two trees by fingerprint doesn't walk them.
+    """
+
+    @property
+    def fingerprint(self):
+        try:
+            return self.__dict__['_fingerprint']
+        except KeyError:
+            fingerprint = self.__dict__['_fingerprint'] = fingerprint_org_tree(self)
+            return fingerprint
+
+
+def fingerprint_org_tree(tree):
+    digest = hashlib.sha1(repr((
+        tree.orgheading,
+        tree.properties,
+        tree.text_content,
+        tree.scheduled,
+        tree.deadline,
+    )))
+    for subtree in tree.subtrees:
+        digest.update(subtree.fingerprint)
+    return digest.digest()
+
+
+def same_org_tree(old, new):
+    """Whether two OrgTrees (or Nones) have the same contents."""
+    if old is new:
+        return True
+    if old is None or new is None:
+        return False
+    return old.fingerprint == new.fingerprint
+
 OrgHeading = collections.namedtuple('OrgHeading', [
     'star_count',  # int
     'title',  # string
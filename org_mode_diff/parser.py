@@ -1,7 +1,11 @@
+import collections
+import mmap
+import os
 import re
 from models import OrgHeading
 from models import OrgTree
 import config
+import stats
 
 
 class OrgParserException(Exception):
@@ -16,6 +20,14 @@ def rest_of_words(string):
     return ' '.join(string.split()[1:])
 
 
+# Group 1: stars (******)
+# Group 2: priority, todo, title
+# Group 3 (optional): tags (:blah:blahblah:)
+ORG_HEADER_REGEX = re.compile("^(\*+)\s+(.*?)(?:\s+(\:(?:.*\:)*))?$")
+DEADLINE_REGEX = re.compile("DEADLINE: (<.*?>)")
+PROPERTY_REGEX = re.compile(":(.*?):\s+(.*?)\s+$")
+
+
 def parse_org_header(line):
     """Given a line, tries to parse it as a org header
 
@@ -24,29 +36,21 @@ def parse_org_header(line):
     returns a OrgHeading
     """
 
-    star_count = None
-    priority = None
-    todo = None
-    title = None
-    tags = []
-
     # First, we do a regex over it to get the easy stuff.
-    # Group 1: stars (******)
-    # Group 2: priority, todo, title
-    # Group 3 (optional): tags (:blah:blahblah:)
-    match = re.search("^(\*+)\s+(.*?)(?:\s+(\:(?:.*\:)*))?$", line)
+    match = ORG_HEADER_REGEX.match(line)
 
     # If we don't find anything, this probably isn't an org heading
     if match is None:
         return None
 
-    data = match.groups()
+    return _org_header_from_match(match)
+
+
+def _org_header_from_match(match, intern_table=None):
+    priority = None
+    todo = None
 
-    if len(data) == 2:
-        raw_stars, raw_maybe_priority_todo_title = data
-        raw_tags = None
-    elif len(data) == 3:
-        raw_stars, raw_maybe_priority_todo_title, raw_tags = data
+    raw_stars, raw_maybe_priority_todo_title, raw_tags = match.groups()
 
     # Parse stars
     star_count = len(raw_stars)
@@ -74,6 +78,11 @@ def parse_org_header(line):
          # remove the first and last :, and split the rest into a list
         tags = tuple(raw_tags[1:-1].split(':'))
 
+    if intern_table is not None:
+        todo = intern_value(intern_table, todo)
+        tags = intern_value(intern_table, tuple(
+            intern_value(intern_table, tag) for tag in tags))
+
     return OrgHeading(
         star_count=star_count,
         title=title,
@@ -83,6 +92,53 @@ def parse_org_header(line):
     )
 
 
+# Kinds of lines, as far as the parser cares
+HEADER_LINE = 'header'
+DEADLINE_SCHEDULED_LINE = 'deadline_scheduled'
+PROPERTIES_LINE = 'properties'
+OTHER_LINE = 'other'
+
+LineToken = collections.namedtuple('LineToken', [
+    'kind',  # one of the *_LINE kinds above
+    'line',  # the line itself
+    'org_header',  # the parsed OrgHeading of a HEADER_LINE, otherwise None
+])
+
+
+def intern_value(intern_table, value):
+    """Returns the copy of value that's in intern_table, adding it if needed.
+
+    Interning the values that repeat across a file (TODO keywords, tags,
+    property names) keeps one copy of each, and comparing two interned values
+    finds they're the same object straight away.
+    """
+    return intern_table.setdefault(value, value)
+
+
+def classify_line(line, intern_table=None):
+    """Works out what kind of line this is, looking at it only once.
+
+    line -- string of a line from an org-mode file
+    intern_table -- dictionary to intern the header's values in, or None
+
+    returns a LineToken
+    """
+    # Only lines starting with a star can be headers, so don't bother
+    # running the regex over the rest.
+    if line[:1] == '*':
+        match = ORG_HEADER_REGEX.match(line)
+        if match is not None:
+            return LineToken(HEADER_LINE, line, _org_header_from_match(match, intern_table))
+
+    if "DEADLINE:" in line or "SCHEDULE:" in line:
+        return LineToken(DEADLINE_SCHEDULED_LINE, line, None)
+
+    if ":PROPERTIES:" in line and line.strip() == ":PROPERTIES:":
+        return LineToken(PROPERTIES_LINE, line, None)
+
+    return LineToken(OTHER_LINE, line, None)
+
+
 class OrgModeFileParser(object):
 
     """Parser than reads in a hierarchical org-mode document by consuming lines.
@@ -97,17 +153,21 @@ class OrgModeFileParser(object):
 
     org_header -- the org header for this section, or None if this is the top-level.
         If you are initalizing this, you will usually leave it blank.
+    intern_table -- dictionary to intern repeated values in, shared with the
+        child parsers. If you are initalizing this, you will usually leave it blank.
 
 
     More details:
         At any given time, the OrgModeFileParser may have a child processor
     """
 
-    def __init__(self, org_header=None):
+    def __init__(self, org_header=None, intern_table=None):
         self.org_header = org_header
         self.depth = 0 if org_header is None else org_header.star_count
+        self.intern_table = {} if intern_table is None else intern_table
 
-        self.content = ""
+        # joined once in get_org_tree, rather than growing a string per line
+        self.content_lines = []
         self.subtrees = []
         self.properties = {}
         self.child_parser = None
@@ -116,24 +176,18 @@ class OrgModeFileParser(object):
 
         self.is_reading_properties = False
 
-    def _is_line_org_header(self, line):
-        # kind of lame we need to do this twice
-        return parse_org_header(line) is not None
-
-    def _is_line_deadline_scheduled(self, line):
-        return "DEADLINE:" in line or "SCHEDULE:" in line
-
-    def _is_at_beginning_of_properties(self, line):
-        return line.strip() == ":PROPERTIES:"
-
     def consume(self, line):
         """Consumes a line of an org-mode file. 
         Returns an org tree if we've reached the beginning of a new org tree, otherwise None.
         """
+        return self.consume_token(classify_line(line, self.intern_table))
+
+    def consume_token(self, token):
+        """Like consume, but for a line that's already been through classify_line."""
 
         # If we have a child parser, give it this line
         if self.child_parser is not None:
-            process_response = self.child_parser.consume(line)
+            process_response = self.child_parser.consume_token(token)
 
             # If we receive data, that means the child_parser has finished parsing its node.
             # We remove the child parser and go on to process the line ourself.
@@ -157,53 +211,58 @@ class OrgModeFileParser(object):
         # I don't support everthing org-mode has, so the rest should get thrown
         # in with content
 
-        if self._is_line_org_header(line):
-            org_header = parse_org_header(line)
+        kind = token.kind
+        line = token.line
 
+        if kind is HEADER_LINE:
             # If we're going down a level, start up a child parser to handle its content.
             # Otherwise, we've finished this node, so return the org tree
-            if org_header.star_count - self.depth > 0:
-                self.child_parser = OrgModeFileParser(org_header)
+            if token.org_header.star_count - self.depth > 0:
+                self.child_parser = OrgModeFileParser(token.org_header, self.intern_table)
             else:
                 return self.get_org_tree()
 
-        elif self._is_line_deadline_scheduled(line):
+        elif kind is DEADLINE_SCHEDULED_LINE:
             if "DEADLINE:" in line:
-                match = re.search("DEADLINE: (<.*?>)", line)
+                match = DEADLINE_REGEX.search(line)
                 if match:
                     self.deadline = match.group(1)
 
             if "SCHEDULED:" in line:
-                match = re.search("DEADLINE: (<.*?>)", line)
+                match = DEADLINE_REGEX.search(line)
                 if match:
                     self.scheduled = match.group(1)
 
-        elif self._is_at_beginning_of_properties(line):
+        elif kind is PROPERTIES_LINE:
             self.is_reading_properties = True  # Now we're reading properties
 
         elif self.is_reading_properties:
             if ":END:" in line:
                 self.is_reading_properties = False
             else:
-                result = re.search(":(.*?):\s+(.*?)\s+$", line)
+                result = PROPERTY_REGEX.search(line)
                 if result:
                     key, value = result.groups()
-                    self.properties[key] = value
+                    self.properties[intern_value(self.intern_table, key)] = value
                 else:
                     raise OrgParserException(
-                        ":PROPERTIES: missing :END:\n%s", line)
+                        ":PROPERTIES: missing :END: before %r" % (line.rstrip('\n'),))
         else:
-            self.content += line
+            self.content_lines.append(line)
 
     def get_org_tree(self):
-        return OrgTree(
+        org_tree = OrgTree(
             orgheading=self.org_header,
-            properties=tuple(self.properties.items()),
-            text_content=self.content,
+            # sorted, so the same drawer always gives the same tuple (and fingerprint)
+            properties=tuple(sorted(self.properties.items())),
+            text_content="".join(self.content_lines),
             subtrees=tuple(self.subtrees),
             deadline=self.deadline,
             scheduled=self.scheduled,
         )
+        # Our subtrees are already fingerprinted, so this only hashes this node.
+        org_tree.fingerprint
+        return org_tree
 
     def flush(self):
         # First, we tell the child that it's over
@@ -212,9 +271,146 @@ class OrgModeFileParser(object):
         return self.get_org_tree()
 
 
-def parse_lines(lines):
-    parser = OrgModeFileParser()
+class OrgModeStackParser(object):
+
+    """Parser that reads the same documents as OrgModeFileParser, and builds
+    the same OrgTree, without passing each line down a chain of child parsers.
+
+    Usage:
+        parser = OrgModeStackParser()
+        for line in org_file_lines:
+            parser.consume(line)
+
+        return parser.flush()
+
+
+    More details:
+        It keeps a stack of OrgModeFileParsers, one for each heading that's
+    still open, with the top-level at the bottom. Each line goes straight to
+    the top of the stack, so a line costs the same however deeply it's nested,
+    and nothing recurses.
+    """
+
+    def __init__(self, intern_table=None):
+        self.intern_table = {} if intern_table is None else intern_table
+        self.stack = []
+        self.stack.append(self._start_heading(None))
+
+    def consume(self, line):
+        """Consumes a line of an org-mode file."""
+        self.consume_token(classify_line(line, self.intern_table))
+
+    def consume_token(self, token):
+        """Like consume, but for a line that's already been through classify_line."""
+        stack = self.stack
+
+        if token.kind is HEADER_LINE:
+            # A header finishes every open heading at its level or deeper,
+            # then starts a new one underneath whatever's left.
+            star_count = token.org_header.star_count
+            while star_count <= stack[-1].depth:
+                self._finish_top()
+            stack.append(self._start_heading(token.org_header))
+        else:
+            stack[-1].consume_token(token)
+
+    def _start_heading(self, org_header):
+        """Returns the OrgModeFileParser that collects the lines of a heading
+        (or of the top-level, if org_header is None)."""
+        return OrgModeFileParser(org_header, self.intern_table)
+
+    def _finish_heading(self, heading_parser):
+        """Returns what to add to the parent's subtrees once a heading's
+        OrgModeFileParser has seen all of its lines, or None to add
+        nothing."""
+        return heading_parser.get_org_tree()
+
+    def _finish_top(self):
+        finished = self.stack.pop()
+        subtree = self._finish_heading(finished)
+        if subtree is not None:
+            self.stack[-1].subtrees.append(subtree)
+
+    def flush(self):
+        while len(self.stack) > 1:
+            self._finish_top()
+        return self._finish_heading(self.stack[0])
+
+
+def parse_lines(lines, parser_class=OrgModeFileParser, intern_table=None):
+    """Parses the lines of an org-mode file into an OrgTree.
+
+    parser_class -- OrgModeFileParser, or OrgModeStackParser for deeply
+        nested files
+    intern_table -- dictionary to intern repeated values in. Pass the same
+        one when parsing two files to diff, so their values are shared too.
+    """
+    org_tree = _parse_lines(lines, parser_class, intern_table)
+    if stats.current is not None:
+        stats.current.add_document(stats.count_nodes(org_tree))
+    return org_tree
+
+
+@stats.timed('parse')
+def _parse_lines(lines, parser_class, intern_table):
+    parser = parser_class(intern_table=intern_table)
     for line in lines:
         parser.consume(line)
 
     return parser.flush()
+
+
+def iter_buffer_lines(buffer):
+    """Yields the lines of a string or string-like buffer (like an mmap), with
+    their newlines, copying out one line at a time."""
+    start = 0
+    end = len(buffer)
+    while start < end:
+        newline = buffer.find('\n', start)
+        stop = end if newline == -1 else newline + 1
+        yield buffer[start:stop]
+        start = stop
+
+
+def _decode_lines(lines, encoding):
+    if encoding is None:
+        return lines
+    return (line.decode(encoding) for line in lines)
+
+
+def parse_file(org_file, encoding=None, parser_class=OrgModeFileParser, intern_table=None):
+    """Parses an open org-mode file as it's read, a line at a time.
+
+    encoding -- if given, lines are decoded into unicode using it. Otherwise
+        they're left as the file's bytes.
+    """
+    return parse_lines(_decode_lines(org_file, encoding), parser_class, intern_table)
+
+
+def parse_buffer(buffer, encoding=None, parser_class=OrgModeFileParser, intern_table=None):
+    """Parses an org-mode file held in a string or an mmap.
+
+    encoding -- as in parse_file
+    """
+    return parse_lines(
+        _decode_lines(iter_buffer_lines(buffer), encoding), parser_class, intern_table)
+
+
+def parse_path(path, encoding=None, use_mmap=False, parser_class=OrgModeFileParser,
+               intern_table=None):
+    """Parses the org-mode file at path without reading all its lines in first.
+
+    encoding -- as in parse_file
+    use_mmap -- map the file into memory and parse from that, rather than
+        reading it a line at a time
+    """
+    with open(path) as org_file:
+        # mmap can't map an empty file
+        if use_mmap and os.fstat(org_file.fileno()).st_size:
+            buffer = mmap.mmap(org_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return parse_buffer(buffer, encoding, parser_class, intern_table)
+            finally:
+                buffer.close()
+
+        return parse_file(org_file, encoding, parser_class, intern_table)
@@ -0,0 +1,116 @@
+from diff import diff_org_tree
+from diff import diff_strings
+from diff import pair_up_subtrees
+from helpers import clear_caches
+from models import getattrs_from_diff
+from models import DiffTuple
+from parser import ORG_HEADER_REGEX
+from parser import parse_lines
+
+
+def split_top_level_sections(lines):
+    """Splits the lines of an org-mode file into the lines before the first
+    heading, followed by the lines of each top-level heading (with all of its
+    subtrees).
+
+    A heading is top-level if it has no more stars than the top-level heading
+    before it, which is where the parser starts a new subtree of the
+    top-level too.
+
+    returns a list of lists of lines
+    """
+    sections = [[]]
+    top_level_star_count = None
+    for line in lines:
+        if line[:1] == '*':
+            # Only check it's really a header if it's not too deeply nested
+            # to be top-level.
+            star_count = len(line) - len(line.lstrip('*'))
+            if ((top_level_star_count is None or star_count <= top_level_star_count)
+                    and ORG_HEADER_REGEX.match(line) is not None):
+                top_level_star_count = star_count
+                sections.append([])
+        sections[-1].append(line)
+    return sections
+
+
+def _fingerprint(org_tree):
+    return None if org_tree is None else org_tree.fingerprint
+
+
+class DiffSession(object):
+
+    """Diffs a file as it's edited against the same base, reusing what it can
+    from the last diff.
+
+    Usage:
+        session = DiffSession(base_lines)
+        while editing:
+            diff = session.diff(current_lines)
+
+    Each top-level heading of the new file is only parsed again if its lines
+    changed since the last diff, and each pair of top-level headings is only
+    diffed again if one of them changed. So an edit costs about as much as
+    parsing and diffing the top-level heading it's in.
+    """
+
+    def __init__(self, base_lines, headers_only=False):
+        self.headers_only = headers_only
+        self.intern_table = {}
+        self.base_org = parse_lines(base_lines, intern_table=self.intern_table)
+        self.new_org = None
+
+        # top-level headings of the last new file, by the text they came from
+        self._sections = {}
+        # the diff of each pair of top-level headings in the last diff, by
+        # their fingerprints
+        self._subtree_diffs = {}
+
+    def parse(self, lines):
+        """Parses a new version of the file, reusing the top-level headings
+        that are unchanged since the last one."""
+        sections = split_top_level_sections(lines)
+
+        previous_sections = self._sections
+        self._sections = {}
+
+        subtrees = []
+        for section in sections[1:]:
+            text = "".join(section)
+            subtree = previous_sections.get(text)
+            if subtree is None:
+                subtree, = parse_lines(section, intern_table=self.intern_table).subtrees
+            self._sections[text] = subtree
+            subtrees.append(subtree)
+
+        top_level = parse_lines(sections[0], intern_table=self.intern_table)
+        return top_level._replace(subtrees=tuple(subtrees))
+
+    def diff(self, lines):
+        """Diffs a new version of the file against the base.
+
+        returns the list of DiffResults, the same as struct_diff's
+        """
+        self.new_org = self.parse(lines)
+        return list(self._iter_diff(DiffTuple(self.base_org, self.new_org)))
+
+    def _iter_diff(self, diff_tuple):
+        clear_caches()
+
+        if not self.headers_only:
+            text_diff = diff_strings(getattrs_from_diff(diff_tuple, "text_content"))
+            if text_diff:
+                yield text_diff
+
+        previous_subtree_diffs = self._subtree_diffs
+        self._subtree_diffs = {}
+
+        for subtree_diff_pair in pair_up_subtrees(getattrs_from_diff(diff_tuple, "subtrees")):
+            key = (_fingerprint(subtree_diff_pair.old), _fingerprint(subtree_diff_pair.new))
+            subtree_diff = previous_subtree_diffs.get(key)
+            if subtree_diff is None:
+                subtree_diff = diff_org_tree(subtree_diff_pair, self.headers_only)
+            self._subtree_diffs[key] = subtree_diff
+
+            for diff_result in subtree_diff:
+                yield diff_result
@@ -0,0 +1,130 @@
+import collections
+import contextlib
+import functools
+import time
+
+
+# The DiffStats being recorded, or None when nothing is.
+current = None
+
+# LRUCaches to report the hit rates of, by name.
+_caches = collections.OrderedDict()
+
+
+def register_cache(name, cache):
+    """Includes a LRUCache's hits and misses in the stats."""
+    _caches[name] = cache
+
+
+class DiffStats(object):
+
+    """Where the time went while diffing, and how much work was done.
+
+    Usage:
+        with stats.collect() as diff_stats:
+            print_diff(iter_struct_diff(DiffTuple(old_org, new_org), False))
+        print diff_stats.to_dict()
+
+    Phases are timed separately, but they nest: align includes the time spent
+    in similarity, and output includes body_diff, since text diffs are only
+    worked out when they're written. Work done in other processes (with
+    jobs > 1) isn't counted.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.counts = collections.defaultdict(int)
+        self.nodes_parsed = 0
+        self.peak_nodes = 0
+        self._cache_counters = dict(
+            (name, (cache.hits, cache.misses)) for name, cache in _caches.iteritems())
+
+    def add_time(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def count(self, name, amount=1):
+        self.counts[name] += amount
+
+    def add_document(self, node_count):
+        """Records a parsed document with node_count nodes."""
+        self.nodes_parsed += node_count
+        self.peak_nodes = max(self.peak_nodes, node_count)
+
+    def cache_stats(self):
+        """Hits, misses and hit rate of each cache since the stats started."""
+        cache_stats = {}
+        for name, cache in _caches.iteritems():
+            start_hits, start_misses = self._cache_counters.get(name, (0, 0))
+            hits = cache.hits - start_hits
+            misses = cache.misses - start_misses
+            cache_stats[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': float(hits) / (hits + misses) if hits + misses else None,
+                'size': len(cache),
+            }
+        return cache_stats
+
+    def to_dict(self):
+        return {
+            'total_seconds': time.time() - self.started,
+            'phases': dict(
+                (phase, {'seconds': seconds, 'calls': self.calls[phase]})
+                for phase, seconds in self.seconds.iteritems()),
+            'counts': dict(self.counts),
+            'caches': self.cache_stats(),
+            'nodes': {
+                'parsed': self.nodes_parsed,
+                'peak': self.peak_nodes,
+            },
+        }
+
+
+@contextlib.contextmanager
+def collect():
+    """Records stats for everything run inside the with block."""
+    global current
+    previous = current
+    current = DiffStats()
+    try:
+        yield current
+    finally:
+        current = previous
+
+
+def timed(phase):
+    """Decorator that adds the time spent in a function to phase, while stats
+    are being collected."""
+    def decorator(function):
+        @functools.wraps(function)
+        def timer(*args, **kwargs):
+            diff_stats = current
+            if diff_stats is None:
+                return function(*args, **kwargs)
+
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                diff_stats.add_time(phase, time.time() - start)
+        return timer
+    return decorator
+
+
+def count(name, amount=1):
+    if current is not None:
+        current.count(name, amount)
+
+
+def count_nodes(org_tree):
+    """Number of nodes in a tree, including the top-level."""
+    node_count = 0
+    stack = [org_tree]
+    while stack:
+        node = stack.pop()
+        node_count += 1
+        stack.extend(node.subtrees)
+    return node_count
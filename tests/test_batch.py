@@ -0,0 +1,138 @@
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from org_mode_diff import batch
+from org_mode_diff import config
+from org_mode_diff.batch import FilePair
+from org_mode_diff.models import DiffResult
+from org_mode_diff.parser import OrgParserException
+
+
+class TestFilePairs(unittest.TestCase):
+
+    def test_parse_file_pair(self):
+        self.assertEqual(
+            batch.parse_file_pair("old.org:new.org"),
+            FilePair('old.org', 'new.org', None))
+
+    def test_parse_bad_file_pair(self):
+        self.assertRaises(ValueError, batch.parse_file_pair, "old.org")
+
+    def test_read_manifest(self):
+        manifest = StringIO.StringIO(
+            "# comment\n"
+            "a.org\tb.org\n"
+            "\n"
+            "c.org\td.org\tcd.diff\n")
+
+        self.assertEqual(batch.read_manifest(manifest), [
+            FilePair('a.org', 'b.org', None),
+            FilePair('c.org', 'd.org', 'cd.diff'),
+        ])
+
+    def test_output_path(self):
+        self.assertEqual(
+            batch.output_path(FilePair('a.org', 'b.org', 'ab.diff'), 'out'),
+            'ab.diff')
+        self.assertEqual(
+            batch.output_path(FilePair('a.org', 'notes/b.org', None), 'out'),
+            os.path.join('out', 'notes', 'b.org.diff'))
+        self.assertEqual(
+            batch.output_path(FilePair('a.org', 'b.org', None), None),
+            None)
+
+    def test_output_path_stays_in_output_dir(self):
+        self.assertEqual(
+            batch.output_path(FilePair('a.org', '../notes/b.org', None), 'out'),
+            os.path.join('out', 'notes', 'b.org.diff'))
+        self.assertEqual(
+            batch.output_path(FilePair('a.org', '/notes/../../b.org', None), 'out'),
+            os.path.join('out', 'b.org.diff'))
+
+
+class TestBatchDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_pairs = []
+        for name, old, new in [
+                ('first', "* Item1\n", "* Item2\n"),
+                ('second', "* Item1\n", "* Item1\n"),
+        ]:
+            old_path = os.path.join(self.directory, name + '-old.org')
+            new_path = os.path.join(self.directory, name + '-new.org')
+            with open(old_path, 'w') as old_file:
+                old_file.write(old)
+            with open(new_path, 'w') as new_file:
+                new_file.write(new)
+            self.file_pairs.append(FilePair(old_path, new_path, None))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_iter_batch_diff(self):
+        results = list(batch.iter_batch_diff(self.file_pairs, False))
+
+        self.assertEqual([file_pair for file_pair, _ in results], self.file_pairs)
+        self.assertEqual(results[0][1], batch.diff_file_pair(self.file_pairs[0], False))
+        self.assertEqual(results[1][1], batch.diff_file_pair(self.file_pairs[1], False))
+
+    def test_iter_batch_diff_missing_file(self):
+        file_pairs = [FilePair(self.file_pairs[0].old, '/nonexistent.org', None)] + self.file_pairs
+        results = list(batch.iter_batch_diff(file_pairs, False))
+
+        self.assertIsInstance(results[0][1], IOError)
+        self.assertEqual(results[1:], list(batch.iter_batch_diff(self.file_pairs, False)))
+
+    def test_iter_batch_diff_missing_file_jobs(self):
+        file_pairs = self.file_pairs + [FilePair(self.file_pairs[0].old, '/nonexistent.org', None)]
+        results = list(batch.iter_batch_diff(file_pairs, False, jobs=2))
+
+        self.assertEqual(results[:2], list(batch.iter_batch_diff(self.file_pairs, False)))
+        self.assertIsInstance(results[2][1], IOError)
+
+    def test_iter_batch_diff_summary_jobs(self):
+        old_path = os.path.join(self.directory, 'text-old.org')
+        new_path = os.path.join(self.directory, 'text-new.org')
+        with open(old_path, 'w') as old_file:
+            old_file.write("* Item1\nSome text\n")
+        with open(new_path, 'w') as new_file:
+            new_file.write("* Item1\nOther text\nMore text\n")
+        file_pairs = self.file_pairs + [FilePair(old_path, new_path, None)]
+
+        # The text diffs mustn't be worked out, even in another process.
+        body_diff_engine = config.body_diff_engine
+        config.body_diff_engine = 'not an engine'
+        try:
+            results = list(batch.iter_batch_diff(file_pairs, False, jobs=2, summary=True))
+        finally:
+            config.body_diff_engine = body_diff_engine
+
+        self.assertEqual(results[2][1], [
+            DiffResult('comment', "[updated]", "* Item1"),
+            DiffResult('comment', "#", "text changed: 1 -> 2 lines"),
+        ])
+
+    def test_iter_batch_diff_malformed_file(self):
+        bad_path = os.path.join(self.directory, 'bad.org')
+        with open(bad_path, 'w') as bad_file:
+            bad_file.write("* Item1\n:PROPERTIES:\nnot a property\n:END:\n")
+        file_pairs = [FilePair(bad_path, self.file_pairs[0].new, None)] + self.file_pairs
+
+        for jobs in (1, 2):
+            results = list(batch.iter_batch_diff(file_pairs, False, jobs=jobs))
+
+            self.assertIsInstance(results[0][1], OrgParserException)
+            self.assertEqual(results[1:], list(batch.iter_batch_diff(self.file_pairs, False)))
+
+    def test_iter_batch_diff_jobs(self):
+        self.assertEqual(
+            list(batch.iter_batch_diff(self.file_pairs, False, jobs=2)),
+            list(batch.iter_batch_diff(self.file_pairs, False)))
+
+
+if __name__ == "__main__":
+    unittest.main()
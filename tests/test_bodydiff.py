@@ -0,0 +1,130 @@
+import difflib
+import random
+import unittest
+
+from org_mode_diff import bodydiff
+from org_mode_diff import config
+from org_mode_diff.diff import diff_strings
+from org_mode_diff.models import DiffTuple
+
+
+def _longest_common_subsequence(old, new):
+    lengths = [0] * (len(new) + 1)
+    for old_item in old:
+        row = [0]
+        for j, new_item in enumerate(new):
+            row.append(lengths[j] + 1 if old_item == new_item else max(lengths[j + 1], row[j]))
+        lengths = row
+    return lengths[-1]
+
+
+class TestMyersOpcodes(unittest.TestCase):
+
+    def assertValidOpcodes(self, old, new, opcodes):
+        position = (0, 0)
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i1, j1), position)
+            if tag == 'equal':
+                self.assertEqual(old[i1:i2], new[j1:j2])
+            rebuilt.extend(new[j1:j2])
+            position = (i2, j2)
+        self.assertEqual(position, (len(old), len(new)))
+        self.assertEqual(rebuilt, new)
+
+    def test_same_as_difflib(self):
+        old = [str(line) for line in range(40)]
+        new = list(old)
+        new[8:8] = ['i']
+        new[20] += 'x'
+        new[23:28] = []
+
+        self.assertEqual(
+            bodydiff.myers_opcodes(old, new),
+            difflib.SequenceMatcher(None, old, new).get_opcodes())
+        self.assertEqual(
+            list(bodydiff.unified_diff(old, new, bodydiff.MYERS)),
+            list(bodydiff.unified_diff(old, new, bodydiff.DIFFLIB)))
+
+    def test_empty(self):
+        self.assertEqual(bodydiff.myers_opcodes([], []), [])
+        self.assertEqual(list(bodydiff.unified_diff([], [], bodydiff.MYERS)), [])
+        self.assertEqual(
+            list(bodydiff.unified_diff([], ['a'], bodydiff.MYERS)),
+            list(bodydiff.unified_diff([], ['a'], bodydiff.DIFFLIB)))
+
+    def test_random(self):
+        rand = random.Random(0)
+        for _ in range(500):
+            old = [rand.choice('abcd') for _ in range(rand.randint(0, 12))]
+            new = [rand.choice('abcd') for _ in range(rand.randint(0, 12))]
+            opcodes = bodydiff.myers_opcodes(old, new)
+
+            self.assertValidOpcodes(old, new, opcodes)
+
+            # Myers' algorithm on its own finds the shortest edit
+            blocks = []
+            bodydiff._myers_blocks(old, 0, len(old), new, 0, len(new), blocks)
+            self.assertEqual(
+                sum(size for _, _, size in blocks),
+                _longest_common_subsequence(old, new))
+
+    def test_repeated_lines(self):
+        old = ["log line"] * 2000 + ["end"]
+        new = ["log line"] * 1000 + ["new line"] + ["log line"] * 1000 + ["end"]
+
+        self.assertEqual(
+            bodydiff.myers_opcodes(old, new),
+            [('equal', 0, 1000, 0, 1000),
+             ('insert', 1000, 1000, 1000, 1001),
+             ('equal', 1000, 2001, 1001, 2002)])
+
+    def test_rewritten(self):
+        old = ["old %d" % i for i in range(5000)]
+        new = ["new %d" % i for i in range(5000)]
+
+        self.assertEqual(bodydiff.myers_opcodes(old, new), [('replace', 0, 5000, 0, 5000)])
+
+    def test_unique_lines_left_out(self):
+        rand = random.Random(0)
+        for _ in range(200):
+            old = [rand.choice('abcxy') for _ in range(rand.randint(0, 12))]
+            new = [rand.choice('abcz') for _ in range(rand.randint(0, 12))]
+            blocks = []
+            bodydiff._diff_gap(old, 0, len(old), new, 0, len(new), blocks)
+
+            self.assertValidOpcodes(
+                old, new, bodydiff._opcodes_from_blocks(blocks, len(old), len(new)))
+            self.assertEqual(
+                sum(size for _, _, size in blocks),
+                _longest_common_subsequence(old, new))
+
+    def test_max_cost(self):
+        old = list('abcabcabc')
+        new = list('cbacbacba')
+        blocks = []
+        bodydiff._myers_blocks(old, 0, len(old), new, 0, len(new), blocks, max_cost=1)
+
+        self.assertEqual(blocks, [])
+        self.assertValidOpcodes(
+            old, new, bodydiff._opcodes_from_blocks(blocks, len(old), len(new)))
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, bodydiff.unified_diff, [], [], 'nope')
+
+
+class TestBodyDiffEngine(unittest.TestCase):
+
+    def tearDown(self):
+        config.body_diff_engine = bodydiff.DIFFLIB
+
+    def test_config(self):
+        texts = DiffTuple("a\nb\nc\n", "a\nc\nd\n")
+        difflib_diff = str(diff_strings(texts).string)
+
+        config.body_diff_engine = bodydiff.MYERS
+        self.assertEqual(str(diff_strings(texts).string), difflib_diff)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from org_mode_diff import config
+from org_mode_diff import parser
+from org_mode_diff.cache import ParseCache
+
+
+CONTENTS = (
+    "Top-level comments\n"
+    "* TODO Item1   :tag:\n"
+    ":PROPERTIES:\n"
+    ":ID: 1 \n"
+    ":END:\n"
+    "text\n"
+    "** Item2\n"
+    "* Item3\n"
+)
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'cache')
+        self.path = os.path.join(self.directory, 'todo.org')
+        with open(self.path, 'w') as org_file:
+            org_file.write(CONTENTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _cached_files(self):
+        return os.listdir(self.cache_directory)
+
+    def test_parse_path(self):
+        parse_cache = ParseCache(self.cache_directory)
+
+        first = parse_cache.parse_path(self.path)
+        second = parse_cache.parse_path(self.path)
+
+        self.assertEqual(first, parser.parse_path(self.path))
+        self.assertEqual(second, first)
+        self.assertEqual(second.fingerprint, first.fingerprint)
+        self.assertEqual(len(self._cached_files()), 1)
+
+    def test_parse_buffer_shares_entries_with_parse_path(self):
+        parse_cache = ParseCache(self.cache_directory)
+
+        self.assertEqual(
+            parse_cache.parse_buffer(CONTENTS), parse_cache.parse_path(self.path))
+        self.assertEqual(len(self._cached_files()), 1)
+
+    def test_status_values_are_part_of_the_key(self):
+        parse_cache = ParseCache(self.cache_directory)
+        parse_cache.parse_buffer(CONTENTS)
+
+        original_status_values = config.status_values
+        config.status_values = ["WAITING"]
+        try:
+            org_tree = parse_cache.parse_buffer(CONTENTS)
+        finally:
+            config.status_values = original_status_values
+
+        self.assertEqual(org_tree.subtrees[0].orgheading.title, 'TODO Item1')
+        self.assertEqual(len(self._cached_files()), 2)
+
+    def test_evicts_when_full(self):
+        parse_cache = ParseCache(self.cache_directory, max_bytes=0)
+        parse_cache.parse_buffer(CONTENTS)
+
+        self.assertEqual(self._cached_files(), [])
+
+    def test_evicts_least_recently_used(self):
+        parse_cache = ParseCache(self.cache_directory)
+        parse_cache.parse_buffer(CONTENTS)
+        old_entry = os.path.join(self.cache_directory, self._cached_files()[0])
+        os.utime(old_entry, (0, 0))
+
+        parse_cache.max_bytes = os.path.getsize(old_entry)
+        parse_cache.parse_buffer(CONTENTS.replace("Item1", "Item9"))
+
+        self.assertEqual(len(self._cached_files()), 1)
+        self.assertEqual(
+            parse_cache.get(parse_cache._key(hashlib.sha1(CONTENTS))), None)
+
+    def test_only_evicts_when_it_might_be_full(self):
+        parse_cache = ParseCache(self.cache_directory)
+        evictions = []
+        evict = parse_cache._evict
+        parse_cache._evict = lambda: evictions.append(evict())
+
+        parse_cache.parse_buffer(CONTENTS)
+        parse_cache.parse_buffer(CONTENTS + "* Item3\n")
+
+        # only the first put looks at the directory
+        self.assertEqual(len(evictions), 1)
+
+    def test_ignores_broken_entries(self):
+        parse_cache = ParseCache(self.cache_directory)
+        parse_cache.parse_buffer(CONTENTS)
+        for name in self._cached_files():
+            with open(os.path.join(self.cache_directory, name), 'w') as cache_file:
+                cache_file.write('not a tree')
+
+        self.assertEqual(
+            parse_cache.parse_buffer(CONTENTS), parser.parse_buffer(CONTENTS))
+
+
+if __name__ == "__main__":
+    unittest.main()
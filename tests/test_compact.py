@@ -0,0 +1,114 @@
+import pickle
+import unittest
+
+from org_mode_diff import parser
+from org_mode_diff.compact import CompactOrgModeParser
+from org_mode_diff.diff import struct_diff
+from org_mode_diff.models import DiffTuple
+
+
+OLD_LINES = [
+    "Top-level comments\n",
+    "* TODO Item1   :tag:other:\n",
+    "  DEADLINE: <2016-01-01>\n",
+    ":PROPERTIES:\n",
+    ":ID: 1 \n",
+    ":END:\n",
+    "text\n",
+    "** Item2\n",
+    "** Item3\n",
+    "more text\n",
+    "* Item4   :tag:other:\n",
+    "**** Item5\n",
+    "* Item6\n",
+]
+
+NEW_LINES = [
+    "Top-level comments\n",
+    "* DONE Item1   :tag:other:\n",
+    "text\n",
+    "** Item3\n",
+    "changed text\n",
+    "* Item4   :tag:other:\n",
+    "* Item7\n",
+]
+
+
+def _parse_compact(lines):
+    return parser.parse_lines(lines, parser_class=CompactOrgModeParser)
+
+
+class TestCompactOrgTree(unittest.TestCase):
+
+    def test_same_tree_as_parse_lines(self):
+        self.assertEqual(
+            _parse_compact(OLD_LINES).to_org_tree(), parser.parse_lines(OLD_LINES))
+
+    def test_same_fingerprints_as_parse_lines(self):
+        compact_tree = _parse_compact(OLD_LINES)
+        org_tree = parser.parse_lines(OLD_LINES)
+
+        self.assertEqual(compact_tree.fingerprint, org_tree.fingerprint)
+        self.assertEqual(
+            [subtree.fingerprint for subtree in compact_tree.subtrees],
+            [subtree.fingerprint for subtree in org_tree.subtrees])
+
+    def test_values_are_stored_once(self):
+        compact_tree = _parse_compact(OLD_LINES)
+        first, second = compact_tree.subtrees[0], compact_tree.subtrees[1]
+
+        self.assertTrue(first.orgheading.tags is second.orgheading.tags)
+
+    def test_parent(self):
+        compact_tree = _parse_compact(OLD_LINES)
+        item3 = compact_tree.subtrees[0].subtrees[1]
+
+        self.assertEqual(item3.orgheading.title, 'Item3')
+        self.assertEqual(item3.parent.orgheading.title, 'Item1')
+        self.assertEqual(compact_tree.parent, None)
+
+    def test_parsers_keep_no_subtrees(self):
+        compact_parser = CompactOrgModeParser()
+        for line in OLD_LINES:
+            compact_parser.consume(line)
+
+        self.assertEqual(
+            [heading_parser.subtrees for heading_parser in compact_parser.stack], [[], []])
+
+    def test_diff(self):
+        self.assertEqual(
+            struct_diff(
+                DiffTuple(_parse_compact(OLD_LINES), _parse_compact(NEW_LINES)),
+                False,
+                supress_output=True),
+            struct_diff(
+                DiffTuple(parser.parse_lines(OLD_LINES), parser.parse_lines(NEW_LINES)),
+                False,
+                supress_output=True))
+
+
+    def test_pickle_only_copies_the_subtree(self):
+        subtree = _parse_compact(OLD_LINES).subtrees[1]
+        unpickled = pickle.loads(pickle.dumps(subtree, pickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(unpickled, subtree.to_org_tree())
+        self.assertEqual(unpickled.fingerprint, subtree.fingerprint)
+        self.assertEqual(
+            len(pickle.dumps(subtree, pickle.HIGHEST_PROTOCOL)),
+            len(pickle.dumps(subtree.to_org_tree(), pickle.HIGHEST_PROTOCOL)))
+
+    def test_diff_jobs(self):
+        self.assertEqual(
+            struct_diff(
+                DiffTuple(_parse_compact(OLD_LINES), _parse_compact(NEW_LINES)),
+                False,
+                supress_output=True,
+                jobs=2),
+            struct_diff(
+                DiffTuple(parser.parse_lines(OLD_LINES), parser.parse_lines(NEW_LINES)),
+                False,
+                supress_output=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,23 @@
+import pickle
+import StringIO
+import sys
 import unittest
 
+from org_mode_diff import config
 from org_mode_diff.diff import org_items_are_similar
 from org_mode_diff.diff import pair_up_subtrees
+from org_mode_diff.diff import diff_properties
+from org_mode_diff.diff import diff_strings
+from org_mode_diff.diff import iter_struct_diff
+from org_mode_diff.diff import MoveIndex
+from org_mode_diff.diff import print_diff
 from org_mode_diff.diff import struct_diff
+from org_mode_diff.diff import summarize_diff
 from org_mode_diff.models import OrgTree
 from org_mode_diff.models import OrgHeading
 from org_mode_diff.models import DiffTuple
 from org_mode_diff.models import DiffResult
+from org_mode_diff.parser import parse_lines
 
 
 def _make_mock_org_tree(title, todo, tags, text_content, subtrees):
@@ -212,6 +223,25 @@ class TestPairSimilarItems(unittest.TestCase):
             expected
         )
 
+class TestDiffProperties(unittest.TestCase):
+
+    def test_unchanged(self):
+        properties = (('ID', '1'), ('CATEGORY', 'work'))
+        self.assertEqual(
+            diff_properties(DiffTuple(properties, tuple(reversed(properties)))), [])
+
+    def test_added_removed_and_changed(self):
+        old = (('ID', '1'), ('OWNER', 'me'), ('CATEGORY', 'work'))
+        new = (('STATUS', 'open'), ('ID', '2'), ('CATEGORY', 'work'))
+
+        self.assertEqual(diff_properties(DiffTuple(old, new)), [
+            DiffResult(type='diff', prefix='-', string='1'),
+            DiffResult(type='diff', prefix='+', string='2'),
+            DiffResult(type='diff', prefix='-', string=('OWNER', 'me')),
+            DiffResult(type='diff', prefix='+', string=('STATUS', 'open')),
+        ])
+
+
 # TODO: more tests!
 class TestStructDiff(unittest.TestCase):
 
@@ -318,6 +348,187 @@ class TestStructDiff(unittest.TestCase):
             DiffResult(type='diff', prefix='+', string='Item'),
         ])
 
+    def test_iter_struct_diff(self):
+        diff = iter_struct_diff(DiffTuple(self.old, self.new), False)
+
+        self.assertEqual(next(diff).prefix, '')
+        self.assertEqual(
+            [next(diff)] + list(diff),
+            struct_diff(DiffTuple(self.old, self.new), False, supress_output=True)[1:])
+
+    def test_struct_diff_jobs(self):
+        self.assertEqual(
+            struct_diff(
+                DiffTuple(self.old, self.new), False, supress_output=True, jobs=2),
+            struct_diff(
+                DiffTuple(self.old, self.new), False, supress_output=True))
+
+    def test_struct_diff_unchanged_text(self):
+        diff = struct_diff(
+            DiffTuple(self.old, self.old), False, supress_output=True)
+        self.assertEqual(diff, [
+            DiffResult(type='comment', prefix='#', string='* Item1'),
+            DiffResult(type='comment', prefix='#', string='* Item3'),
+        ])
+
+    def test_struct_diff_prints_to_current_stdout(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            struct_diff(DiffTuple(self.old, self.old), False)
+            printed = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(printed, "# * Item1\n# * Item3\n")
+
+    def test_print_unicode(self):
+        old_org = parse_lines([u"* Caf\xe9\n", u"au lait\n"])
+        new_org = parse_lines([u"* Caf\xe9s\n", u"cr\xe8me\n"])
+        out = StringIO.StringIO()
+        print_diff(struct_diff(DiffTuple(old_org, new_org), False, supress_output=True), out)
+
+        self.assertEqual(out.getvalue(), "\n".join([
+            "[updated] * Caf\xc3\xa9s",
+            "- Caf\xc3\xa9",
+            "+ Caf\xc3\xa9s",
+            " --- old",
+            "+++ new",
+            "@@ -1,2 +1,2 @@",
+            "-au lait",
+            "+cr\xc3\xa8me",
+            " ",
+        ]) + "\n")
+
+    def test_struct_diff_summary_jobs(self):
+        # The text diffs mustn't be worked out, even in another process.
+        body_diff_engine = config.body_diff_engine
+        config.body_diff_engine = 'not an engine'
+        try:
+            diff = struct_diff(
+                DiffTuple(self.old, self.new), False, supress_output=True, jobs=2, summary=True)
+        finally:
+            config.body_diff_engine = body_diff_engine
+
+        self.assertEqual(diff, list(summarize_diff(
+            struct_diff(DiffTuple(self.old, self.new), False, supress_output=True))))
+
+
+class TestDiffStrings(unittest.TestCase):
+
+    def test_lazy(self):
+        diff_result = diff_strings(DiffTuple("a\nb\n", "a\nc\n"))
+
+        self.assertIsNone(diff_result.string._diff)
+        self.assertEqual(
+            diff_result,
+            DiffResult('diff', '', "--- old\n+++ new\n@@ -1,3 +1,3 @@\n a\n-b\n+c\n "))
+
+    def test_unchanged(self):
+        self.assertIsNone(diff_strings(DiffTuple("a\n", "a\n")))
+
+    def test_summarize(self):
+        text_diff = diff_strings(DiffTuple("a\nb\n", "a\nc\nd"))
+        header = DiffResult('comment', "[updated]", "* Item")
+
+        self.assertEqual(
+            list(summarize_diff([header, text_diff])),
+            [header, DiffResult('comment', "#", "text changed: 2 -> 3 lines")])
+        self.assertIsNone(text_diff.string._diff)
+
+    def test_pickle(self):
+        text_diff = diff_strings(DiffTuple(None, "a\n")).string
+        unpickled = pickle.loads(pickle.dumps(text_diff))
+
+        self.assertEqual(unpickled, text_diff)
+        self.assertEqual(unpickled.line_counts(), (0, 1))
+
+
+MOVES_OLD = """* Project A
+** Write report
+Some notes
+** Call Bob
+* Project B
+** Buy milk
+"""
+
+MOVES_NEW = """* Project A
+** Call Bob
+* Project B
+** Buy milk
+** Write report
+Some notes
+"""
+
+
+class TestDetectMoves(unittest.TestCase):
+
+    def setUp(self):
+        self.diff_tuple = DiffTuple(
+            parse_lines(MOVES_OLD.splitlines(True)),
+            parse_lines(MOVES_NEW.splitlines(True)))
+
+    def test_without_detect_moves(self):
+        diff = struct_diff(self.diff_tuple, True, supress_output=True)
+
+        self.assertIn(DiffResult('diff', "-", "** Write report"), diff)
+        self.assertIn(DiffResult('diff', "+", "** Write report"), diff)
+
+    def test_detect_moves(self):
+        self.assertEqual(
+            struct_diff(self.diff_tuple, True, supress_output=True, detect_moves=True),
+            [
+                DiffResult('comment', "[updated]", "* Project A"),
+                DiffResult('comment', "[moved away]", "** Write report"),
+                DiffResult('comment', "#", "** Call Bob"),
+                DiffResult('comment', "[updated]", "* Project B"),
+                DiffResult('comment', "#", "** Buy milk"),
+                DiffResult('comment', "[moved here]", "** Write report"),
+            ])
+
+    def test_detect_moves_jobs(self):
+        self.assertEqual(
+            struct_diff(self.diff_tuple, False, supress_output=True, jobs=2, detect_moves=True),
+            struct_diff(self.diff_tuple, False, supress_output=True, detect_moves=True))
+
+    def test_duplicates_are_not_moves(self):
+        old_org = parse_lines((MOVES_OLD + "** Write report\nSome notes\n").splitlines(True))
+        write_report = self.diff_tuple.new.subtrees[1].subtrees[1]
+
+        self.assertFalse(MoveIndex(old_org, self.diff_tuple.new).is_moved(write_report))
+        self.assertTrue(MoveIndex(*self.diff_tuple).is_moved(write_report))
+
+    def test_moved_to_another_level(self):
+        new_org = parse_lines("""* Project A
+** Call Bob
+* Project B
+** Buy milk
+*** Write report
+Some notes
+""".splitlines(True))
+
+        self.assertEqual(
+            struct_diff(
+                DiffTuple(self.diff_tuple.old, new_org), True, supress_output=True,
+                detect_moves=True)[-1],
+            DiffResult('comment', "[moved here]", "*** Write report"))
+
+    def test_subtrees_keep_their_levels(self):
+        old_org = parse_lines("* A\n** B\n*** C\n* D\n".splitlines(True))
+        new_org = parse_lines("* A\n* D\n** B\n** C\n".splitlines(True))
+
+        self.assertFalse(MoveIndex(old_org, new_org).is_moved(new_org.subtrees[1].subtrees[0]))
+
+    def test_copy_of_paired_heading_is_not_moved(self):
+        old_org = parse_lines("* Meeting notes\nAgenda\n* Project\n".splitlines(True))
+        new_org = parse_lines(
+            "* Meeting notes\nAgenda and minutes\n* Project\n** Meeting notes\nAgenda\n".splitlines(True))
+
+        diff = struct_diff(DiffTuple(old_org, new_org), True, supress_output=True, detect_moves=True)
+
+        self.assertIn(DiffResult('comment', "[updated]", "* Meeting notes"), diff)
+        self.assertIn(DiffResult('diff', "+", "** Meeting notes"), diff)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from org_mode_diff.git import GitBlobReader
+from org_mode_diff.git import GitException
+from org_mode_diff.git import WORKTREE
+from org_mode_diff.git import iter_revision_diff
+from org_mode_diff.models import DiffResult
+
+
+def _git(repository, *args):
+    subprocess.check_call(
+        ('git', '-c', 'user.name=test', '-c', 'user.email=test@example.com') + args,
+        cwd=repository,
+        stdout=open(os.devnull, 'w'))
+
+
+class TestGitBlobReader(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.repository, 'notes'))
+        self.path = os.path.join(self.repository, 'notes', 'todo.org')
+
+        _git(self.repository, 'init', '-q')
+        with open(self.path, 'w') as org_file:
+            org_file.write("* Item1\n")
+        _git(self.repository, 'add', '.')
+        _git(self.repository, 'commit', '-q', '-m', 'first')
+        with open(self.path, 'w') as org_file:
+            org_file.write("* Item2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.repository)
+
+    def test_read(self):
+        with GitBlobReader(self.repository) as reader:
+            self.assertEqual(reader.read('HEAD', 'notes/todo.org'), "* Item1\n")
+            self.assertEqual(reader.read(WORKTREE, 'notes/todo.org'), "* Item2\n")
+            self.assertEqual(reader.read('HEAD', 'notes/missing.org'), None)
+            self.assertEqual(reader.read(WORKTREE, 'notes/missing.org'), None)
+
+    def test_read_from_subdirectory(self):
+        with GitBlobReader(os.path.join(self.repository, 'notes')) as reader:
+            self.assertEqual(reader.read('HEAD', 'todo.org'), "* Item1\n")
+
+    def test_iter_revision_diff(self):
+        self.assertEqual(
+            list(iter_revision_diff(['notes/todo.org'], 'HEAD', WORKTREE, False, self.repository)),
+            [('notes/todo.org', [
+                DiffResult(type='comment', prefix='[updated]', string='* Item2'),
+                DiffResult(type='diff', prefix='-', string='Item1'),
+                DiffResult(type='diff', prefix='+', string='Item2'),
+            ])])
+
+    def test_iter_revision_diff_jobs(self):
+        self.assertEqual(
+            list(iter_revision_diff(
+                ['notes/todo.org'], 'HEAD', WORKTREE, False, self.repository, jobs=2)),
+            list(iter_revision_diff(['notes/todo.org'], 'HEAD', WORKTREE, False, self.repository)))
+
+    def test_iter_revision_diff_unknown_revision(self):
+        with self.assertRaises(GitException):
+            list(iter_revision_diff(['notes/todo.org'], 'HAED', WORKTREE, False, self.repository))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import difflib
+import random
+import unittest
+
+from org_mode_diff.helpers import LRUCache
+from org_mode_diff.helpers import anchored_zip
+from org_mode_diff.helpers import sequences_are_similar
+from org_mode_diff.helpers import smart_zip
+from org_mode_diff.models import DiffTuple
+
+
+def _recursive_smart_zip(old, new, similarity_function):
+    """The original recursive alignment, kept around to check against."""
+    if not new:
+        return [DiffTuple(item, None) for item in old]
+    if not old:
+        return [DiffTuple(None, item) for item in new]
+
+    if similarity_function(old[0], new[0]):
+        return [DiffTuple(old[0], new[0])] + _recursive_smart_zip(old[1:], new[1:], similarity_function)
+
+    skip_old = _recursive_smart_zip(old[1:], new, similarity_function)
+    skip_new = _recursive_smart_zip(old, new[1:], similarity_function)
+    if len(skip_new) < len(skip_old):
+        return [DiffTuple(None, new[0])] + skip_new
+    else:
+        return [DiffTuple(old[0], None)] + skip_old
+
+
+def _same_first_letter(old, new):
+    return old[0] == new[0]
+
+
+class TestSmartZip(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(smart_zip(DiffTuple((), ())), [])
+
+    def test_only_old(self):
+        self.assertEqual(
+            smart_zip(DiffTuple(('a', 'b'), ())),
+            [DiffTuple('a', None), DiffTuple('b', None)])
+
+    def test_only_new(self):
+        self.assertEqual(
+            smart_zip(DiffTuple((), ('a', 'b'))),
+            [DiffTuple(None, 'a'), DiffTuple(None, 'b')])
+
+    def test_ties_keep_the_old(self):
+        self.assertEqual(
+            smart_zip(DiffTuple(('a',), ('b',))),
+            [DiffTuple('a', None), DiffTuple(None, 'b')])
+
+    def test_matches_recursive_alignment(self):
+        rand = random.Random(4)
+        for _ in range(200):
+            old = tuple(rand.choice('abcde') + str(i) for i in range(rand.randint(0, 7)))
+            new = tuple(rand.choice('abcde') + str(i) for i in range(rand.randint(0, 7)))
+            self.assertEqual(
+                smart_zip(DiffTuple(old, new), _same_first_letter),
+                _recursive_smart_zip(old, new, _same_first_letter))
+
+    def test_compares_each_pair_once(self):
+        calls = []
+
+        def similarity_function(old_item, new_item):
+            calls.append((old_item, new_item))
+            return old_item[0] == new_item[0]
+
+        old = ('a1', 'b2', 'c3', 'a4')
+        new = ('b1', 'a2', 'c3')
+        smart_zip(DiffTuple(old, new), similarity_function)
+
+        self.assertEqual(sorted(calls), sorted(set(calls)))
+        self.assertEqual(len(calls), len(old) * len(new))
+
+    def test_lengths_over_two_bytes(self):
+        old = tuple(range(40000))
+        new = (39999,)
+
+        result = smart_zip(DiffTuple(old, new))
+
+        self.assertEqual(result[-1], DiffTuple(39999, 39999))
+        self.assertEqual(len(result), 40000)
+
+    def test_long_lists(self):
+        old = tuple(range(1500))
+        new = tuple(range(1, 1501))
+
+        result = smart_zip(DiffTuple(old, new))
+
+        self.assertEqual(len(result), 1501)
+        self.assertEqual(result[0], DiffTuple(0, None))
+        self.assertEqual(result[-1], DiffTuple(None, 1500))
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue('c' in cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_clear_keeps_counters(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.clear()
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.bytes, 0)
+        self.assertEqual(cache.hits, 1)
+
+    def test_smart_zip_is_cached(self):
+        smart_zip.cache.clear()
+        diff_tuple = DiffTuple(('a', 'b'), ('b',))
+        hits = smart_zip.cache.hits
+
+        first = smart_zip(diff_tuple)
+        second = smart_zip(diff_tuple)
+
+        self.assertTrue(first is second)
+        self.assertEqual(smart_zip.cache.hits, hits + 1)
+
+
+def _identity(item):
+    return item
+
+
+class TestAnchoredZip(unittest.TestCase):
+
+    def test_aligns_gaps_between_anchors(self):
+        old = ('a1', 'b1', 'c1', 'd1')
+        new = ('a1', 'b2', 'x1', 'c1', 'd1')
+
+        self.assertEqual(
+            anchored_zip(DiffTuple(old, new), _same_first_letter, _identity),
+            [
+                DiffTuple('a1', 'a1'),
+                DiffTuple('b1', 'b2'),
+                DiffTuple(None, 'x1'),
+                DiffTuple('c1', 'c1'),
+                DiffTuple('d1', 'd1'),
+            ])
+
+    def test_keeps_anchors_in_order(self):
+        old = ('a1', 'b1', 'c1')
+        new = ('c1', 'a1', 'b1')
+
+        self.assertEqual(
+            anchored_zip(DiffTuple(old, new), _same_first_letter, _identity),
+            [
+                DiffTuple(None, 'c1'),
+                DiffTuple('a1', 'a1'),
+                DiffTuple('b1', 'b1'),
+                DiffTuple('c1', None),
+            ])
+
+    def test_repeated_items_are_not_anchors(self):
+        old = ('a1', 'a1')
+        new = ('b1', 'a1')
+
+        self.assertEqual(
+            anchored_zip(DiffTuple(old, new), _same_first_letter, _identity),
+            smart_zip(DiffTuple(old, new), _same_first_letter))
+
+    def test_long_lists_with_few_changes(self):
+        old = tuple('a%d' % i for i in range(5000))
+        new = old[:1000] + ('b1',) + old[1001:4000] + old[4001:]
+
+        result = anchored_zip(DiffTuple(old, new), _same_first_letter, _identity)
+
+        self.assertEqual(len(result), 5001)
+        self.assertEqual(result[1000], DiffTuple('a1000', None))
+        self.assertEqual(result[1001], DiffTuple(None, 'b1'))
+
+
+class TestSequencesAreSimilar(unittest.TestCase):
+
+    def test_matches_sequence_matcher_ratio(self):
+        rand = random.Random(10)
+        words = ['', 'a', 'task', 'test title', 'testtitle', 'meeting notes', 'notes']
+        for _ in range(500):
+            old = rand.choice(words) + rand.choice(words)
+            new = rand.choice(words) + rand.choice(words)
+            requirement = rand.choice([0.0, 0.5, 0.75, 0.9])
+            self.assertEqual(
+                sequences_are_similar(old, new, requirement),
+                difflib.SequenceMatcher(None, old, new).ratio() > requirement,
+                (old, new, requirement))
+
+    def test_empty_strings(self):
+        self.assertTrue(sequences_are_similar('', '', 0.75))
+        self.assertFalse(sequences_are_similar('', 'title', 0.75))
+
+
+if __name__ == "__main__":
+    unittest.main()
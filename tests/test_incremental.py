@@ -0,0 +1,107 @@
+import random
+import unittest
+
+from org_mode_diff.incremental import LineEdit
+from org_mode_diff.incremental import parse_incrementally
+from org_mode_diff.parser import OrgParserException
+from org_mode_diff.parser import parse_lines
+
+
+LINES = """Some text before the headings
+* TODO Item1
+Text of item 1
+** Item1.1
+:PROPERTIES:
+:KEY: value 
+:END:
+** Item1.2
+DEADLINE: <2014-01-01 Wed>
+* Item2
+** Item2.1
+Text of item 2.1
+*** Item2.1.1
+* Item3
+""".splitlines(True)
+
+NEW_LINES = [
+    "More text\n",
+    "* New item\n",
+    "** New item\n",
+    "*** New item\n",
+    ":PROPERTIES:\n",
+    ":OTHER: value \n",
+    ":END:\n",
+    "SCHEDULED: <2014-01-02 Thu>\n",
+]
+
+
+class TestIncrementalParse(unittest.TestCase):
+
+    def assertParsedLike(self, parsed, lines):
+        self.assertEqual(parsed.lines, lines)
+        self.assertEqual(parsed.org_tree, parse_lines(lines))
+        self.assertEqual(parsed.org_tree.fingerprint, parse_lines(lines).fingerprint)
+
+    def test_parse(self):
+        self.assertParsedLike(parse_incrementally(LINES), LINES)
+
+    def test_edit_text(self):
+        parsed = parse_incrementally(LINES)
+        edited = parsed.apply_edits([LineEdit(11, 12, ["Changed text\n"])])
+
+        lines = list(LINES)
+        lines[11] = "Changed text\n"
+        self.assertParsedLike(edited, lines)
+
+        # only Item2.1 was parsed again
+        self.assertIs(edited.org_tree.subtrees[0], parsed.org_tree.subtrees[0])
+        self.assertIs(edited.org_tree.subtrees[2], parsed.org_tree.subtrees[2])
+        self.assertIsNot(edited.org_tree.subtrees[1], parsed.org_tree.subtrees[1])
+
+    def test_edit_adding_a_header(self):
+        parsed = parse_incrementally(LINES)
+        edited = parsed.apply_edits([LineEdit(3, 3, ["* New item\n"])])
+
+        self.assertParsedLike(edited, LINES[:3] + ["* New item\n"] + LINES[3:])
+
+    def test_several_edits(self):
+        edited = parse_incrementally(LINES).apply_edits([
+            LineEdit(2, 3, []),
+            LineEdit(0, 0, ["More text\n"]),
+            LineEdit(13, 13, ["More text\n"]),
+        ])
+
+        self.assertParsedLike(
+            edited, ["More text\n"] + LINES[:2] + LINES[3:13] + ["More text\n"] + LINES[13:])
+
+    def test_bad_edit(self):
+        parsed = parse_incrementally(LINES)
+        self.assertRaises(ValueError, parsed.apply_edits, [LineEdit(3, 2, [])])
+        self.assertRaises(ValueError, parsed.apply_edits, [LineEdit(0, len(LINES) + 1, [])])
+
+    def test_random_edits(self):
+        rand = random.Random(0)
+        parsed = parse_incrementally(LINES)
+        lines = list(LINES)
+
+        for _ in range(300):
+            start = rand.randint(0, len(lines))
+            end = rand.randint(start, min(start + 3, len(lines)))
+            new_lines = [rand.choice(NEW_LINES) for _ in range(rand.randint(0, 3))]
+
+            edit = LineEdit(start, end, new_lines)
+            edited_lines = lines[:start] + new_lines + lines[end:]
+            try:
+                parse_lines(edited_lines)
+            except OrgParserException:
+                # e.g. a property drawer without its :END:
+                self.assertRaises(OrgParserException, parsed.apply_edits, [edit])
+                continue
+
+            parsed = parsed.apply_edits([edit])
+            lines = edited_lines
+            self.assertParsedLike(parsed, lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
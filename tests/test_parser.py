@@ -1,3 +1,6 @@
+import os
+import StringIO
+import tempfile
 import unittest
 
 from org_mode_diff import parser
@@ -88,6 +91,38 @@ class TestParseHeaders(unittest.TestCase):
                 tags=tuple()))
 
 
+class TestClassifyLine(unittest.TestCase):
+
+    def test_header(self):
+        token = parser.classify_line("** TODO hello   :blah:\n")
+        self.assertEqual(token.kind, parser.HEADER_LINE)
+        self.assertEqual(
+            token.org_header,
+            OrgHeading(
+                star_count=2,
+                title='hello',
+                priority=None,
+                todo='TODO',
+                tags=('blah',)))
+
+    def test_bold_text_is_not_a_header(self):
+        self.assertEqual(
+            parser.classify_line("*bold* text\n").kind, parser.OTHER_LINE)
+
+    def test_deadline(self):
+        self.assertEqual(
+            parser.classify_line("  DEADLINE: <2016-01-01>\n").kind,
+            parser.DEADLINE_SCHEDULED_LINE)
+
+    def test_properties(self):
+        self.assertEqual(
+            parser.classify_line("  :PROPERTIES:\n").kind, parser.PROPERTIES_LINE)
+
+    def test_other(self):
+        self.assertEqual(
+            parser.classify_line("just text\n").kind, parser.OTHER_LINE)
+
+
 class TestParser(unittest.TestCase):
 
     def test_no_items(self):
@@ -358,5 +393,161 @@ class TestParser(unittest.TestCase):
             )
         )
 
+class TestFingerprint(unittest.TestCase):
+
+    lines = [
+        "Top-level comments",
+        "* Item1",
+        "** Item2",
+        "text",
+        "* Item3",
+    ]
+
+    def test_same_contents_same_fingerprint(self):
+        self.assertEqual(
+            parser.parse_lines(self.lines).fingerprint,
+            parser.parse_lines(list(self.lines)).fingerprint)
+
+    def test_nested_change_changes_fingerprint(self):
+        changed_lines = list(self.lines)
+        changed_lines[3] = "other text"
+
+        old = parser.parse_lines(self.lines)
+        new = parser.parse_lines(changed_lines)
+
+        self.assertNotEqual(old.fingerprint, new.fingerprint)
+        self.assertNotEqual(
+            old.subtrees[0].fingerprint, new.subtrees[0].fingerprint)
+        self.assertEqual(
+            old.subtrees[1].fingerprint, new.subtrees[1].fingerprint)
+
+    def test_fingerprint_matches_unparsed_tree(self):
+        self.assertEqual(
+            parser.parse_lines(["* Item1"]).subtrees[0].fingerprint,
+            OrgTree(
+                orgheading=OrgHeading(
+                    star_count=1, title='Item1', priority=None, todo=None, tags=()),
+                properties=(),
+                text_content='',
+                subtrees=(),
+                scheduled=None,
+                deadline=None
+            ).fingerprint)
+
+class TestInterning(unittest.TestCase):
+
+    lines = [
+        "* TODO Item1   :work:home:\n",
+        ":PROPERTIES:\n",
+        ":ID: 1 \n",
+        ":END:\n",
+        "** TODO Item2   :work:home:\n",
+        ":PROPERTIES:\n",
+        ":ID: 2 \n",
+        ":END:\n",
+    ]
+
+    def _check_values_are_shared(self, tree):
+        first = tree.subtrees[0]
+        second = first.subtrees[0]
+
+        self.assertTrue(first.orgheading.todo is second.orgheading.todo)
+        self.assertTrue(first.orgheading.tags is second.orgheading.tags)
+        self.assertTrue(first.properties[0][0] is second.properties[0][0])
+
+    def test_parse_lines(self):
+        self._check_values_are_shared(parser.parse_lines(self.lines))
+
+    def test_stack_parser(self):
+        self._check_values_are_shared(parser.parse_lines(
+            self.lines, parser_class=parser.OrgModeStackParser))
+
+    def test_shared_between_files(self):
+        intern_table = {}
+        first = parser.parse_lines(self.lines[:4], intern_table=intern_table)
+        second = parser.parse_lines(self.lines[4:], intern_table=intern_table)
+
+        self.assertTrue(
+            first.subtrees[0].orgheading.tags is second.subtrees[0].orgheading.tags)
+
+
+class TestStackParser(unittest.TestCase):
+
+    def test_same_tree_as_parse_lines(self):
+        lines = [
+            "Top-level comments\n",
+            "* TODO Item1   :tag:\n",
+            "  DEADLINE: <2016-01-01>\n",
+            ":PROPERTIES:\n",
+            ":ID: 1 \n",
+            ":END:\n",
+            "text\n",
+            "*** Item2\n",
+            "** Item3\n",
+            "more text\n",
+            "* Item4\n",
+            "**** Item5\n",
+            "* Item6\n",
+        ]
+
+        self.assertEqual(
+            parser.parse_lines(lines, parser_class=parser.OrgModeStackParser),
+            parser.parse_lines(lines))
+
+    def test_deeply_nested(self):
+        depth = 3000
+        lines = ["*" * star_count + " Item\n" for star_count in range(1, depth + 1)]
+
+        tree = parser.parse_lines(lines, parser_class=parser.OrgModeStackParser)
+
+        for _ in range(depth):
+            self.assertEqual(len(tree.subtrees), 1)
+            tree = tree.subtrees[0]
+        self.assertEqual(tree.subtrees, ())
+
+class TestParseSources(unittest.TestCase):
+
+    contents = "Top-level comments\n* Item1\ntext\n** Item2\n* Item3"
+
+    def setUp(self):
+        self.expected = parser.parse_lines(
+            StringIO.StringIO(self.contents).readlines())
+
+    def test_iter_buffer_lines(self):
+        self.assertEqual(
+            list(parser.iter_buffer_lines(self.contents)),
+            StringIO.StringIO(self.contents).readlines())
+
+    def test_parse_file(self):
+        self.assertEqual(
+            parser.parse_file(StringIO.StringIO(self.contents)), self.expected)
+
+    def test_parse_buffer(self):
+        self.assertEqual(parser.parse_buffer(self.contents), self.expected)
+
+    def test_parse_path(self):
+        handle, path = tempfile.mkstemp(suffix='.org')
+        try:
+            os.write(handle, self.contents)
+            os.close(handle)
+
+            self.assertEqual(parser.parse_path(path), self.expected)
+            self.assertEqual(parser.parse_path(path, use_mmap=True), self.expected)
+        finally:
+            os.remove(path)
+
+    def test_parse_empty_path_with_mmap(self):
+        handle, path = tempfile.mkstemp(suffix='.org')
+        try:
+            os.close(handle)
+            self.assertEqual(
+                parser.parse_path(path, use_mmap=True), parser.parse_lines([]))
+        finally:
+            os.remove(path)
+
+    def test_encoding(self):
+        tree = parser.parse_buffer("* caf\xc3\xa9\n", encoding='utf-8')
+        self.assertEqual(tree.subtrees[0].orgheading.title, u'caf\xe9')
+
 if __name__ == '__main__':
     unittest.main()
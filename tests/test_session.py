@@ -0,0 +1,74 @@
+import unittest
+
+from org_mode_diff.diff import struct_diff
+from org_mode_diff.models import DiffTuple
+from org_mode_diff.parser import parse_lines
+from org_mode_diff.session import DiffSession
+from org_mode_diff.session import split_top_level_sections
+
+
+BASE = """Some text before the headings
+* TODO Item1
+Text of item 1
+** Item1.1
+:PROPERTIES:
+:KEY: value 
+:END:
+* Item2
+** Item2.1
+Text of item 2.1
+* Item3
+"""
+
+EDITS = [
+    BASE,
+    BASE.replace("Text of item 1", "Changed text of item 1"),
+    BASE.replace("* Item3\n", "* Item3\n* Item4\n"),
+    BASE.replace("Some text before", "Some other text before"),
+    BASE.replace("* Item2\n", ""),
+    BASE,
+]
+
+
+class TestDiffSession(unittest.TestCase):
+
+    def test_split_top_level_sections(self):
+        self.assertEqual(
+            split_top_level_sections([
+                "text\n", "** Item1\n", "*** Item1.1\n", "* Item2\n", "*bold*\n", "** Item2.1\n"]),
+            [
+                ["text\n"],
+                ["** Item1\n", "*** Item1.1\n"],
+                ["* Item2\n", "*bold*\n", "** Item2.1\n"],
+            ])
+
+    def test_same_as_struct_diff(self):
+        session = DiffSession(BASE.splitlines(True))
+        base_org = parse_lines(BASE.splitlines(True))
+
+        for new in EDITS:
+            new_org = parse_lines(new.splitlines(True))
+            self.assertEqual(session.diff(new.splitlines(True)), struct_diff(
+                DiffTuple(base_org, new_org), False, supress_output=True))
+            self.assertEqual(session.new_org, new_org)
+
+    def test_headers_only(self):
+        session = DiffSession(BASE.splitlines(True), headers_only=True)
+        base_org = parse_lines(BASE.splitlines(True))
+        new_org = parse_lines(EDITS[1].splitlines(True))
+
+        self.assertEqual(session.diff(EDITS[1].splitlines(True)), struct_diff(
+            DiffTuple(base_org, new_org), True, supress_output=True))
+
+    def test_reuses_unchanged_headings(self):
+        session = DiffSession(BASE.splitlines(True))
+        first_org = session.parse(BASE.splitlines(True))
+        second_org = session.parse(EDITS[1].splitlines(True))
+
+        self.assertIsNot(first_org.subtrees[0], second_org.subtrees[0])
+        self.assertIs(first_org.subtrees[1], second_org.subtrees[1])
+        self.assertIs(first_org.subtrees[2], second_org.subtrees[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
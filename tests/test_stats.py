@@ -0,0 +1,51 @@
+import StringIO
+import unittest
+
+from org_mode_diff import stats
+from org_mode_diff.diff import iter_struct_diff
+from org_mode_diff.diff import print_diff
+from org_mode_diff.models import DiffTuple
+from org_mode_diff.parser import parse_lines
+
+
+OLD = """* Item1
+Some text
+* Item2
+** Item2.1
+"""
+
+NEW = """* Item1
+Some other text
+* Item 2
+** Item2.1
+* Item3
+"""
+
+
+class TestStats(unittest.TestCase):
+
+    def test_collect(self):
+        with stats.collect() as diff_stats:
+            old_org = parse_lines(OLD.splitlines(True))
+            new_org = parse_lines(NEW.splitlines(True))
+            print_diff(iter_struct_diff(DiffTuple(old_org, new_org), False), StringIO.StringIO())
+
+        self.assertIsNone(stats.current)
+
+        results = diff_stats.to_dict()
+        self.assertEqual(
+            sorted(results['phases']),
+            ['align', 'body_diff', 'output', 'parse', 'similarity'])
+        self.assertEqual(results['phases']['parse']['calls'], 2)
+        self.assertEqual(results['counts']['alignment_cells'], 2 * 3)
+        self.assertEqual(results['nodes'], {'parsed': 9, 'peak': 5})
+        self.assertIn('alignments', results['caches'])
+        self.assertIn('similarity_matchers', results['caches'])
+
+    def test_not_collecting(self):
+        parse_lines(OLD.splitlines(True))
+        self.assertIsNone(stats.current)
+
+
+if __name__ == "__main__":
+    unittest.main()